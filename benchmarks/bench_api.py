@@ -0,0 +1,96 @@
+"""API latency benchmark: per-endpoint latency percentiles through the Flask test client.
+
+Loads a backup into a scratch database, then calls every /api/v1 read endpoint repeatedly.
+The response cache is disabled so each request does the full work; pass --cached to measure
+cache hits instead.
+
+Run from the project root:
+    python -m benchmarks.bench_api [10k|1m|10m|path/to/backup.xml] [--requests N] [--cached]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every GET endpoint under /api/v1, with the query shapes the dashboard sends
+ENDPOINTS = [
+    "/api/v1/dashboard",
+    "/api/v1/messages",
+    "/api/v1/messages?page=20&per_page=50",
+    "/api/v1/messages?category=Incoming%20Money&start_date=2024-06-01&end_date=2024-09-01",
+    "/api/v1/messages?search=jane",
+    "/api/v1/messages?search=samuel%20carter&sort=relevance",
+    "/api/v1/messages?after=&per_page=50",
+    "/api/v1/messages?after=WyIyMDI0LTA5LTAxVDEyOjAwOjAwIiwgNTAwXQ==&per_page=50",
+    "/api/v1/messages/export?format=ndjson&start_date=2024-06-01&end_date=2024-06-01",
+    "/api/v1/messages/export?format=csv&start_date=2024-06-01&end_date=2024-06-01",
+    "/api/v1/statistics",
+    "/api/v1/categories",
+    "/api/v1/trends/daily",
+    "/api/v1/trends/volume/daily",
+    "/api/v1/top/recipients",
+    "/api/v1/top/senders",
+    "/api/v1/analytics?bucket=week&metric=sum&group_by=category",
+    "/api/v1/analytics?bucket=day&metric=percentile&q=90",
+    "/api/v1/imports",
+    "/api/v1/cache/stats",
+]
+DEFAULT_REQUESTS = 20 # Timed requests per endpoint, after one warm-up request
+
+def percentile(ordered, q):
+    """q-th percentile of an ascending list, interpolating between closest ranks"""
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def run_api_benchmark(app, endpoints=ENDPOINTS, requests=DEFAULT_REQUESTS):
+    """Return {endpoint: latency summary in milliseconds} for each endpoint"""
+    client = app.test_client()
+    results = {}
+    for endpoint in endpoints:
+        response = client.get(endpoint) # Warm-up: imports, column store load, SQLite page cache
+        response.get_data() # Read streamed bodies to the end before the next request
+        status = response.status_code
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(endpoint)
+            response.get_data() # Streamed responses do their work while being read
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[endpoint] = {
+            "status": status,
+            "requests": len(timings),
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p90_ms": round(percentile(timings, 90), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3),
+            "max_ms": round(timings[-1], 3),
+        }
+    return results
+
+def main():
+    from benchmarks.corpus import SIZES, ensure_corpus
+    from benchmarks.bench_ingest import scratch_app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="10k", help=f"One of {', '.join(SIZES)} or an XML file")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--cached", action="store_true", help="Keep the response cache enabled")
+    args = parser.parse_args()
+
+    if not args.cached:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    xml_file_path = args.corpus if os.path.exists(args.corpus) else ensure_corpus(args.corpus)
+    app, _ = scratch_app()
+    with app.app_context():
+        from src.data_processor import parse_xml_and_populate_db
+        parse_xml_and_populate_db(xml_file_path)
+    print(json.dumps(run_api_benchmark(app, requests=args.requests), indent=2))
+
+if __name__ == "__main__":
+    main()
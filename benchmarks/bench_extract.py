@@ -0,0 +1,45 @@
+"""Micro-benchmark for SMS categorization and field extraction.
+
+Run from the project root:
+    python -m benchmarks.bench_extract [path/to/backup.xml] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_processor import categorize_and_extract, extractor, iter_sms_records
+
+DEFAULT_XML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modified_sms_v2.xml")
+
+def time_per_message(func, bodies, repeat):
+    """Return the best observed time per message in microseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for body in bodies:
+            func(body)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(bodies) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("xml_file", nargs="?", default=DEFAULT_XML)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bodies = [body for _, _, body in iter_sms_records(args.xml_file)]
+    print(f"{len(bodies)} messages, best of {args.repeat} runs")
+
+    for label, func in [
+        ("MessageExtractor.extract", extractor.extract),
+        ("categorize_and_extract", categorize_and_extract),
+    ]:
+        per_message = time_per_message(func, bodies, args.repeat)
+        print(f"{label:<28} {per_message:8.2f} us/message  {1e6 / per_message:12,.0f} messages/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Ingest benchmark: parse, extract and insert throughput for one backup file.
+
+Imports the backup into a fresh scratch database in a single pass and times each stage
+separately: streaming the XML (parse), categorization and extraction (extract), and the
+batched database writes (insert).
+
+Run from the project root:
+    python -m benchmarks.bench_ingest [10k|1m|10m|path/to/backup.xml] [--batch-size N]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run_ingest_benchmark(xml_file_path, batch_size=None):
+    """Import xml_file_path into the app's database and return per-stage timings
+
+    Needs an app context; the database should be empty so every message is inserted.
+    """
+    from src.data_processor import BulkIngestor, DEFAULT_BATCH_SIZE, iter_sms_records, peak_rss_mb, process_sms_record
+
+    ingestor = BulkIngestor(batch_size=batch_size or DEFAULT_BATCH_SIZE) # No source, so no checkpoint
+    records = iter_sms_records(xml_file_path)
+    clock = time.perf_counter
+    parse = extract = insert = 0.0
+
+    started = clock()
+    while True:
+        before_parse = clock()
+        record = next(records, None)
+        before_extract = clock()
+        if record is None:
+            break
+        processed = process_sms_record(*record)
+        before_insert = clock()
+        ingestor.add(*processed)
+        finished = clock()
+        parse += before_extract - before_parse
+        extract += before_insert - before_extract
+        insert += finished - before_insert
+    before_flush = clock()
+    ingestor.flush()
+    insert += clock() - before_flush
+    total = clock() - started
+
+    messages = ingestor.messages_read
+    def stage(seconds):
+        return {"seconds": round(seconds, 4), "messages_per_sec": round(messages / seconds, 1) if seconds else None}
+    return {
+        "messages": messages,
+        "messages_written": ingestor.messages_written,
+        "batch_size": ingestor.batch_size,
+        "parse": stage(parse),
+        "extract": stage(extract),
+        "insert": stage(insert),
+        "total": stage(total),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None,
+    }
+
+def scratch_app():
+    """Import the Flask app bound to a new, empty SQLite database and return (app, db)"""
+    scratch = tempfile.mkdtemp(prefix="momo-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(scratch, "bench.db")
+    from src.main import app
+    from src.models.user import db
+    from src.models.migrations import upgrade_schema
+    with app.app_context():
+        upgrade_schema()
+    return app, db
+
+def main():
+    from benchmarks.corpus import SIZES, ensure_corpus
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="10k", help=f"One of {', '.join(SIZES)} or an XML file")
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    xml_file_path = args.corpus if os.path.exists(args.corpus) else ensure_corpus(args.corpus)
+    app, _ = scratch_app()
+    with app.app_context():
+        results = run_ingest_benchmark(xml_file_path, args.batch_size)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Concurrency check: read endpoints must stay fast and error-free while an import runs.
+
+Loads the sample backup into a scratch database, measures the read endpoints while idle,
+then uploads a generated corpus through POST /api/v1/imports and keeps calling the same
+endpoints from several threads until the import finishes. Exits with status 1 if any read
+failed or the p99 latency during the import exceeded --max-p99-ms.
+
+This is the concurrency test for the database profile. The project has no pytest suite, so
+it runs as a script that passes or fails through its exit status, and CI can run it as is
+with a small --size.
+
+Run from the project root:
+    python -m benchmarks.concurrent_reads [--size 50000] [--readers 4] [--profile tuned|plain]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+READ_ENDPOINTS = [
+    "/api/v1/dashboard",
+    "/api/v1/messages?per_page=50",
+    "/api/v1/messages?search=jane",
+    "/api/v1/statistics",
+    "/api/v1/trends/daily",
+    "/api/v1/top/recipients",
+]
+DEFAULT_SIZE = "50000"
+DEFAULT_READERS = 4
+DEFAULT_MAX_P99_MS = 1000.0
+IDLE_SECONDS = 2.0
+
+class Reader(threading.Thread):
+    """Calls the read endpoints in a loop until stopped, recording latencies and failures"""
+
+    def __init__(self, app, stop):
+        super().__init__(daemon=True)
+        self.client = app.test_client()
+        self.stop = stop
+        self.timings = []
+        self.errors = []
+
+    def run(self):
+        while not self.stop.is_set():
+            for endpoint in READ_ENDPOINTS:
+                started = time.perf_counter()
+                try:
+                    response = self.client.get(endpoint)
+                    response.get_data()
+                    if response.status_code != 200:
+                        self.errors.append(f"{endpoint}: HTTP {response.status_code}")
+                except Exception as e:
+                    self.errors.append(f"{endpoint}: {e}")
+                self.timings.append((time.perf_counter() - started) * 1000)
+
+def hammer(app, readers, until):
+    """Run reader threads until until() returns True; return (sorted timings, errors)"""
+    stop = threading.Event()
+    threads = [Reader(app, stop) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    while not until():
+        time.sleep(0.05)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    timings = sorted(timing for thread in threads for timing in thread.timings)
+    errors = [error for thread in threads for error in thread.errors]
+    return timings, errors
+
+def summary(timings):
+    from benchmarks.bench_api import percentile
+    if not timings:
+        return "no requests"
+    return (f"{len(timings)} requests, p50 {percentile(timings, 50):.1f} ms, "
+            f"p99 {percentile(timings, 99):.1f} ms, max {timings[-1]:.1f} ms")
+
+def main():
+    from benchmarks.corpus import ensure_corpus
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default=DEFAULT_SIZE, help="Corpus imported while reading (10k, 1m, 10m or a count)")
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS)
+    parser.add_argument("--profile", default="tuned", help="DATABASE_PROFILE to test")
+    parser.add_argument("--max-p99-ms", type=float, default=DEFAULT_MAX_P99_MS)
+    args = parser.parse_args()
+
+    xml_file_path = ensure_corpus(args.size)
+    scratch = tempfile.mkdtemp(prefix="momo-concurrency-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(scratch, "concurrency.db")
+    os.environ["DATABASE_PROFILE"] = args.profile
+    os.environ["RESPONSE_CACHE_SIZE"] = "0" # Every read goes to the database
+
+    from src.main import app, initialize_database
+    initialize_database() # Schema plus the sample backup, so the reads have data from the start
+
+    idle_until = time.perf_counter() + IDLE_SECONDS
+    idle_timings, idle_errors = hammer(app, args.readers, lambda: time.perf_counter() >= idle_until)
+    print(f"Idle:         {summary(idle_timings)}")
+
+    client = app.test_client()
+    with open(xml_file_path, "rb") as upload:
+        job = client.post("/api/v1/imports", data={"file": (upload, os.path.basename(xml_file_path))}).get_json()
+    def import_finished():
+        return client.get(f"/api/v1/imports/{job['id']}").get_json()["status"] in ("completed", "failed")
+    timings, errors = hammer(app, args.readers, import_finished)
+    job = client.get(f"/api/v1/imports/{job['id']}").get_json()
+    print(f"During import: {summary(timings)}")
+    print(f"Import {job['status']}: {job['messages_written']:,} messages in {job['elapsed_seconds']:.1f}s "
+          f"({job['messages_per_second']:,.0f} messages/sec)")
+
+    from benchmarks.bench_api import percentile
+    failures = idle_errors + errors + [f"import: {error}" for error in job["errors"]]
+    if job["status"] != "completed":
+        failures.append(f"import {job['status']}")
+    if timings and percentile(timings, 99) > args.max_p99_ms:
+        failures.append(f"p99 during import {percentile(timings, 99):.1f} ms > {args.max_p99_ms:.0f} ms")
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""Seeded generator for synthetic M-Money SMS backups.
+
+Message bodies come from templates derived from the sample backup: amounts, dates, ids and
+counterparty names and phones are replaced with generated values, and templates are drawn as often as
+they occur in the sample. The same seed and size always produce the same file.
+
+Run from the project root:
+    python -m benchmarks.corpus 1m [--seed 42] [--days 365] [--counterparties 200] [--output path/to/corpus.xml]
+"""
+import argparse
+import itertools
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_processor import extractor, iter_sms_records
+
+SAMPLE_XML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modified_sms_v2.xml")
+CORPUS_DIR = os.path.join(tempfile.gettempdir(), "momo-bench")
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+DEFAULT_SEED = 42
+DEFAULT_DAYS = 365 # Period the generated messages are spread over
+DEFAULT_COUNTERPARTIES = 200 # Distinct people messages are exchanged with
+EPOCH = datetime(1970, 1, 1)
+CORPUS_VERSION = 2 # Part of the cached file name; bump whenever the generated bodies change
+
+# Variable parts of a body, in priority order: a date-time, an amount in RWF, a Rwandan phone
+# number, or an id
+TOKEN_RE = re.compile(
+    r"(?P<datetime>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})"
+    r"|(?P<amount>\d{1,3}(?:,\d{3})+|\d+)(?=\s*RWF)"
+    r"|(?P<phone>250\d{9})(?!\d)"
+    r"|(?P<digits>\d{5,})"
+)
+PERSON_NAME_RE = re.compile(r"^[A-Z][a-z]+ [A-Z][a-z]+$")
+
+FIRST_NAMES = ["Jane", "Robert", "Samuel", "Alex", "Linda", "Grace", "Eric", "Aline", "Jean", "Diane",
+               "Patrick", "Claire", "Olivier", "Sandrine", "David", "Esther", "Kevin", "Ange", "Moses", "Nadia"]
+LAST_NAMES = ["Smith", "Brown", "Carter", "Doe", "Green", "Uwase", "Mugisha", "Habimana", "Ingabire", "Niyonzima",
+              "Mukamana", "Nshuti", "Iradukunda", "Kamanzi", "Umutoni", "Gatera", "Keza", "Rugamba", "Mutesi", "Byiringiro"]
+
+def tokenize(text):
+    """Split text into literal strings and (kind, width) placeholders"""
+    parts = []
+    position = 0
+    for match in TOKEN_RE.finditer(text):
+        if match.start() > position:
+            parts.append(text[position:match.start()])
+        kind = match.lastgroup
+        if kind == "amount":
+            parts.append(("amount", "," in match.group()))
+        else:
+            parts.append((kind, len(match.group())))
+        position = match.end()
+    if position < len(text):
+        parts.append(text[position:])
+    return parts
+
+def load_templates(sample_xml=SAMPLE_XML):
+    """Return (templates, weights) derived from the bodies of a sample backup"""
+    counts = {}
+    for _, _, body in iter_sms_records(sample_xml):
+        # Person-to-person messages get a generated counterparty instead of the sample's name
+        name = extractor.extract(body).recipient_name
+        if name and PERSON_NAME_RE.match(name):
+            pieces = body.split(name)
+            template = []
+            for index, piece in enumerate(pieces):
+                if index:
+                    template.append(("name", 0))
+                template.extend(tokenize(piece))
+        else:
+            template = tokenize(body)
+        key = tuple(template)
+        counts[key] = counts.get(key, 0) + 1
+    templates = sorted(counts) # Fixed order, so a seed always picks the same templates
+    return templates, [counts[template] for template in templates]
+
+def readable_date(moment):
+    """Format a date like the backup's readable_date attribute ("10 May 2024 4:30:58 PM")"""
+    hour = moment.hour % 12 or 12
+    return f"{moment.day} {moment:%b %Y} {hour}:{moment:%M:%S %p}"
+
+class CorpusGenerator:
+    """Renders synthetic messages from sample templates with a seeded random generator"""
+
+    def __init__(self, seed=DEFAULT_SEED, counterparties=DEFAULT_COUNTERPARTIES, sample_xml=SAMPLE_XML):
+        self.random = random.Random(seed)
+        self.templates, weights = load_templates(sample_xml)
+        self.cum_weights = list(itertools.accumulate(weights))
+        names = [f"{first} {last}" for last in LAST_NAMES for first in FIRST_NAMES]
+        self.names = names[:max(1, counterparties)]
+        # Every counterparty keeps one phone number, so recipients repeat like they do in real backups
+        numbers = self.random.sample(range(10_000_000), len(self.names))
+        self.phones = {name: f"25078{number:07d}" for name, number in zip(self.names, numbers)}
+
+    def render(self, template, moment):
+        """Fill a template's placeholders for a message sent at moment"""
+        rng = self.random
+        name = rng.choice(self.names)
+        text = []
+        for part in template:
+            if isinstance(part, str):
+                text.append(part)
+                continue
+            kind, detail = part
+            if kind == "datetime":
+                text.append(moment.strftime("%Y-%m-%d %H:%M:%S"))
+            elif kind == "amount":
+                # Mostly small everyday amounts, occasionally large ones
+                amount = int(round(10 ** rng.uniform(2, 5.7), -1))
+                text.append(f"{amount:,}" if detail else str(amount))
+            elif kind == "phone":
+                text.append(self.phones[name])
+            elif kind == "digits":
+                text.append(str(rng.randrange(10 ** (detail - 1), 10 ** detail)))
+            else:
+                text.append(name)
+        return "".join(text)
+
+    def messages(self, count, start, days=DEFAULT_DAYS):
+        """Yield (date_ms, body, datetime) for count messages spread over days from start"""
+        rng = self.random
+        mean_gap_ms = days * 86_400_000 / max(1, count)
+        date_ms = (start - EPOCH) // timedelta(milliseconds=1) # Naive UTC, so the output does not depend on the local timezone
+        for _ in range(count):
+            date_ms += 1 + int(rng.expovariate(1 / mean_gap_ms))
+            template = rng.choices(self.templates, cum_weights=self.cum_weights)[0]
+            moment = EPOCH + timedelta(milliseconds=date_ms)
+            yield date_ms, self.render(template, moment), moment
+
+def write_corpus(path, count, seed=DEFAULT_SEED, days=DEFAULT_DAYS, counterparties=DEFAULT_COUNTERPARTIES):
+    """Write a synthetic backup with count messages to path"""
+    generator = CorpusGenerator(seed, counterparties)
+    start = datetime(2024, 5, 10)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        out.write(f'<smses count="{count}" backup_set="synthetic-{seed}" type="full">\n')
+        for date_ms, body, moment in generator.messages(count, start, days):
+            out.write(
+                f'  <sms protocol="0" address="M-Money" date="{date_ms}" type="1" subject="null" body={quoteattr(body)} '
+                f'toa="null" sc_toa="null" service_center="+250788110381" read="1" status="-1" locked="0" '
+                f'date_sent="{date_ms - date_ms % 1000}" sub_id="6" readable_date="{readable_date(moment)}" contact_name="(Unknown)" />\n'
+            )
+        out.write("</smses>\n")
+    return path
+
+def corpus_path(size, seed=DEFAULT_SEED, days=DEFAULT_DAYS, counterparties=DEFAULT_COUNTERPARTIES):
+    """Default location of a generated corpus, shared between benchmark runs"""
+    # Non-default shapes get their own file, so they never replace the corpus the benchmarks reuse
+    shape = "" if (days, counterparties) == (DEFAULT_DAYS, DEFAULT_COUNTERPARTIES) else f"-days{days}-cp{counterparties}"
+    return os.path.join(CORPUS_DIR, f"corpus-{size}-seed{seed}{shape}-v{CORPUS_VERSION}.xml")
+
+def ensure_corpus(size, seed=DEFAULT_SEED):
+    """Return the path of the corpus for a size name or message count, generating it if needed"""
+    path = corpus_path(size, seed)
+    if not os.path.exists(path):
+        count = SIZES[size] if size in SIZES else int(size)
+        partial = path + ".partial" # Renamed when complete, so an interrupted run is not reused
+        write_corpus(partial, count, seed)
+        os.replace(partial, path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("size", help=f"One of {', '.join(SIZES)} or a message count")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--counterparties", type=int, default=DEFAULT_COUNTERPARTIES)
+    parser.add_argument("--output", help="Defaults to a shared file under the system temp directory")
+    args = parser.parse_args()
+
+    count = SIZES[args.size] if args.size in SIZES else int(args.size)
+    path = args.output or corpus_path(args.size, args.seed, args.days, args.counterparties)
+    write_corpus(path, count, args.seed, args.days, args.counterparties)
+    print(f"Wrote {count:,} messages to {path}")
+
+if __name__ == "__main__":
+    main()
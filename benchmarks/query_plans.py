@@ -0,0 +1,112 @@
+"""Query-plan regression check for the /api/v1 endpoints.
+
+Loads the sample backup into a scratch SQLite database, calls every endpoint through the
+Flask test client, and runs EXPLAIN QUERY PLAN on each SQL statement it issued. Any statement
+that scans a table without an index (other than the small rollup table) is reported and the
+script exits with status 1.
+
+Run from the project root:
+    python -m benchmarks.query_plans
+"""
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Requests that cover every query shape the dashboard sends
+ENDPOINTS = [
+    "/api/v1/messages",
+    "/api/v1/messages?page=3&per_page=25",
+    "/api/v1/messages?start_date=2024-06-01&end_date=2024-09-01",
+    "/api/v1/messages?category=Incoming%20Money",
+    "/api/v1/messages?category=Incoming%20Money&start_date=2024-06-01&end_date=2024-09-01",
+    "/api/v1/messages?search=jane",
+    "/api/v1/messages?after=&per_page=25",
+    "/api/v1/messages?after=WyIyMDI0LTA5LTAxVDEyOjAwOjAwIiwgNTAwXQ==&category=Incoming%20Money",
+    "/api/v1/messages?search=samuel%20carter&sort=relevance",
+    "/api/v1/messages/export?category=Incoming%20Money&start_date=2024-06-01",
+    "/api/v1/statistics",
+    "/api/v1/categories",
+    "/api/v1/trends/daily",
+    "/api/v1/trends/volume/daily",
+    "/api/v1/top/recipients",
+    "/api/v1/top/senders",
+    "/api/v1/dashboard",
+]
+
+# "SCAN messages" reads every row; "SCAN messages USING [COVERING] INDEX ..." does not touch the table
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+# Pre-aggregated tables are small by design, so the analytics endpoints may read them in full
+SCANNABLE_TABLES = {"daily_rollups"}
+
+def full_scans(connection, statement, parameters, table_names):
+    """Return the plan lines of a statement that scan one of the given tables without an index"""
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        match = FULL_SCAN_RE.match(detail)
+        if match and match.group(1) in table_names:
+            scans.append(detail)
+    return scans
+
+def check_query_plans(app, db, endpoints=ENDPOINTS):
+    """Call each endpoint and return a list of (endpoint, statement, scans) for table scans"""
+    from sqlalchemy import event
+
+    captured = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    failures = []
+    with app.app_context():
+        table_names = set(db.metadata.tables) - SCANNABLE_TABLES
+        engine = db.engine
+        client = app.test_client()
+        for endpoint in endpoints:
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                response = client.get(endpoint)
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+            if response.status_code != 200:
+                failures.append((endpoint, None, [f"HTTP {response.status_code}"]))
+                continue
+
+            with engine.connect() as connection:
+                for statement, parameters in dict.fromkeys(captured):
+                    scans = full_scans(connection, statement, parameters, table_names)
+                    if scans:
+                        failures.append((endpoint, statement, scans))
+    return failures
+
+def main():
+    scratch = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(scratch, "plans.db")
+
+    from src.main import app, initialize_database
+    from src.models.user import db
+
+    initialize_database()
+    with app.app_context():
+        db.session.execute(db.text("ANALYZE")) # Give the planner real statistics, as a long-lived database would have
+        db.session.commit()
+
+    failures = check_query_plans(app, db)
+    for endpoint, statement, scans in failures:
+        print(f"FULL SCAN {endpoint}")
+        if statement:
+            print(f"    {' '.join(statement.split())}")
+        for scan in scans:
+            print(f"    -> {scan}")
+
+    print(f"{len(ENDPOINTS)} endpoints checked, {len(failures)} full scan(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
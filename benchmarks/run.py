@@ -0,0 +1,133 @@
+"""Run the ingest, API and storage benchmarks on a generated corpus and compare with a baseline.
+
+Writes one JSON document with the environment, ingest stage throughput, per-endpoint
+latency percentiles and bytes stored per message. With --baseline, each number is compared
+with an earlier run on the same corpus, and the exit status is 1 if any of them got worse by
+more than --tolerance.
+
+Run from the project root:
+    python -m benchmarks.run --size 10k --output results.json
+    python -m benchmarks.run --size 10k --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_TOLERANCE = 0.10 # Relative change tolerated before a number counts as a regression
+
+def git_revision():
+    """Current commit of the working tree, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(size, seed, requests, cached=False):
+    """Generate (or reuse) the corpus, run the benchmarks and return the results document"""
+    from benchmarks.corpus import ensure_corpus
+    from benchmarks.bench_ingest import run_ingest_benchmark, scratch_app
+    from benchmarks.bench_api import run_api_benchmark
+    from benchmarks.storage import storage_report
+
+    if not cached:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    xml_file_path = ensure_corpus(size, seed)
+    app, db = scratch_app()
+    with app.app_context():
+        ingest = run_ingest_benchmark(xml_file_path)
+    # The API runs against the database the ingest benchmark just filled
+    api = run_api_benchmark(app, requests=requests)
+    with app.app_context():
+        storage = storage_report(db)
+    return {
+        "meta": {
+            "corpus": size,
+            "seed": seed,
+            "messages": ingest["messages"],
+            "response_cache": cached,
+            "revision": git_revision(),
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "ingest": ingest,
+        "api": api,
+        "storage": storage,
+    }
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Return (rows, regressions): one row per compared number, and the rows that got worse
+
+    Ingest stages are compared on messages/sec (higher is better), endpoints on p50 and p90
+    latency, storage on bytes per message (both lower is better).
+    """
+    rows = []
+    for stage in ("parse", "extract", "insert", "total"):
+        old = baseline.get("ingest", {}).get(stage, {}).get("messages_per_sec")
+        new = current["ingest"][stage]["messages_per_sec"]
+        if old and new:
+            rows.append((f"ingest {stage} msg/s", old, new, new / old - 1, new < old * (1 - tolerance)))
+    for endpoint, timings in current["api"].items():
+        old_timings = baseline.get("api", {}).get(endpoint)
+        if not old_timings:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            old, new = old_timings[key], timings[key]
+            if old:
+                rows.append((f"{endpoint} {key}", old, new, new / old - 1, new > old * (1 + tolerance)))
+    old = baseline.get("storage", {}).get("compact", {}).get("bytes_per_message")
+    new = current["storage"]["compact"]["bytes_per_message"]
+    if old and new:
+        rows.append(("storage bytes/message", old, new, new / old - 1, new > old * (1 + tolerance)))
+    return rows, [row for row in rows if row[4]]
+
+def main():
+    from benchmarks.corpus import DEFAULT_SEED, SIZES
+    from benchmarks.bench_api import DEFAULT_REQUESTS
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="10k", help=f"One of {', '.join(SIZES)} or a message count")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Timed requests per endpoint")
+    parser.add_argument("--cached", action="store_true", help="Keep the response cache enabled")
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run_suite(args.size, args.seed, args.requests, args.cached)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline["meta"]["corpus"], baseline["meta"]["seed"]) != (args.size, args.seed):
+        print(f"Warning: the baseline was measured on corpus {baseline['meta']['corpus']} (seed {baseline['meta']['seed']})")
+
+    rows, regressions = compare(baseline, results, args.tolerance)
+    print(f"\n{'':60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for label, old, new, change, regressed in rows:
+        print(f"{label[:60]:60} {old:12,.2f} {new:12,.2f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Storage benchmark: bytes per message of the compact messages layout and of the original one.
+
+Loads a backup into a scratch SQLite database, then copies the same messages into the
+original layout (every field stored as text or float, the body in full) in an attached
+database, and measures both with SQLite's dbstat table. The full-text index is left out, as
+it holds the same text either way.
+
+Run from the project root:
+    python -m benchmarks.storage [10k|1m|10m|path/to/backup.xml]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The messages table and its indexes as they were before compact storage
+LEGACY_DDL = [
+    """CREATE TABLE legacy.messages (
+        message_id INTEGER NOT NULL PRIMARY KEY,
+        sender_id INTEGER,
+        recipient_id INTEGER,
+        timestamp DATETIME NOT NULL,
+        message_body TEXT NOT NULL,
+        category VARCHAR(50),
+        transaction_amount FLOAT,
+        currency VARCHAR(10),
+        status VARCHAR(20),
+        new_balance FLOAT,
+        fee FLOAT,
+        transaction_id VARCHAR(50),
+        recipient_name VARCHAR(100),
+        dedup_key VARCHAR(40)
+    )""",
+    "CREATE INDEX legacy.ix_messages_timestamp ON messages (timestamp)",
+    "CREATE INDEX legacy.ix_messages_category_timestamp ON messages (category, timestamp)",
+    "CREATE UNIQUE INDEX legacy.ix_messages_dedup_key ON messages (dedup_key)",
+]
+LEGACY_COLUMNS = [
+    "message_id", "sender_id", "recipient_id", "timestamp", "message_body", "category", "transaction_amount",
+    "currency", "status", "new_balance", "fee", "transaction_id", "recipient_name", "dedup_key",
+]
+LOOKUP_TABLES = ["categories", "currencies", "statuses", "counterparties", "body_suffixes"]
+
+def table_sizes(connection, schema="main"):
+    """Return {table or index name: (owning table, bytes)} for one attached database"""
+    from sqlalchemy import text
+    return {
+        name: (table, size) for name, table, size in connection.execute(text(
+            f"SELECT dbstat.name, sqlite_master.tbl_name, SUM(dbstat.pgsize) FROM dbstat(:schema) AS dbstat "
+            f"JOIN {schema}.sqlite_master AS sqlite_master ON sqlite_master.name = dbstat.name GROUP BY dbstat.name"
+        ), {"schema": schema})
+    }
+
+def layout_size(sizes, tables, messages):
+    """Sum the bytes of the given tables, split into table data and index data"""
+    table_bytes = sum(size for name, (table, size) in sizes.items() if table in tables and name == table)
+    index_bytes = sum(size for name, (table, size) in sizes.items() if table in tables and name != table)
+    total = table_bytes + index_bytes
+    return {
+        "table_bytes": table_bytes,
+        "index_bytes": index_bytes,
+        "total_bytes": total,
+        "bytes_per_message": round(total / messages, 1) if messages else None,
+    }
+
+def storage_report(db):
+    """Measure the messages storage of the app's SQLite database against the original layout
+
+    Needs an app context.
+    """
+    from sqlalchemy import column, select, table, text
+    from src.models.sms import Message
+
+    scratch = tempfile.mkdtemp(prefix="momo-storage-")
+    messages = db.session.query(Message.message_id).count()
+    with db.engine.connect() as connection:
+        connection.execute(text("ATTACH DATABASE :path AS legacy"), {"path": os.path.join(scratch, "legacy.db")})
+        try:
+            for statement in LEGACY_DDL:
+                connection.execute(text(statement))
+            # The decoded attributes of Message give back the original value of every field
+            legacy_messages = table("messages", *(column(name) for name in LEGACY_COLUMNS), schema="legacy")
+            source = select(*(getattr(Message, name) for name in LEGACY_COLUMNS))
+            connection.execute(legacy_messages.insert().from_select(LEGACY_COLUMNS, source))
+            compact = layout_size(table_sizes(connection), {"messages", *LOOKUP_TABLES}, messages)
+            legacy = layout_size(table_sizes(connection, "legacy"), {"messages"}, messages)
+        finally:
+            connection.execute(text("DETACH DATABASE legacy"))
+    return {
+        "messages": messages,
+        "compact": compact,
+        "legacy": legacy,
+        "saving": round(1 - compact["total_bytes"] / legacy["total_bytes"], 3) if legacy["total_bytes"] else None,
+    }
+
+def main():
+    from benchmarks.corpus import SIZES, ensure_corpus
+    from benchmarks.bench_ingest import run_ingest_benchmark, scratch_app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default="10k", help=f"One of {', '.join(SIZES)} or an XML file")
+    args = parser.parse_args()
+
+    xml_file_path = args.corpus if os.path.exists(args.corpus) else ensure_corpus(args.corpus)
+    app, db = scratch_app()
+    with app.app_context():
+        run_ingest_benchmark(xml_file_path)
+        report = storage_report(db)
+    print(json.dumps(report, indent=2))
+    print(f"\n{'':8} {'table':>12} {'indexes':>12} {'total':>12} {'bytes/message':>14}")
+    for layout in ("legacy", "compact"):
+        sizes = report[layout]
+        print(f"{layout:8} {sizes['table_bytes']:12,} {sizes['index_bytes']:12,} {sizes['total_bytes']:12,} {sizes['bytes_per_message']:14,.1f}")
+    print(f"Compact storage saves {report['saving']:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""In-memory columnar analytics over the messages table.
+
+The numeric and categorical columns of `messages` are loaded into NumPy arrays (timestamps as
+int64 epoch seconds, categories and counterparties dictionary-encoded as int32 codes) and
+grouped/bucketed aggregations are answered with vectorized operations. The store follows the
+data version bumped by ingest and loads only the messages added since its last refresh.
+
+NumPy is optional and imported on first use: without it, `analytics_available()` is False and
+the endpoint reports so.
+"""
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import Integer, cast, func, select
+from src.models.user import db # Import the shared db instance
+from src.models.sms import Message, Category, Counterparty, DataVersion
+
+np = None # NumPy, imported by analytics_available() on first use so it doesn't slow down startup
+
+BUCKETS = ("hour", "day", "week", "month")
+METRICS = ("count", "sum", "mean", "min", "max", "percentile", "balance")
+FIELDS = {"amount": "amounts", "fee": "fees"}
+GROUPINGS = ("none", "category", "counterparty")
+LOAD_CHUNK_SIZE = 50000 # Rows read from the database per round trip while loading
+
+def analytics_available():
+    """Return True when NumPy is installed, importing it the first time"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+def epoch_seconds(column):
+    """SQL expression for a DateTime column as integer seconds since 1970-01-01 (wall-clock time)"""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", column), Integer)
+    return None # Converted in Python instead
+
+class ColumnStore:
+    """NumPy column arrays for every message, refreshed incrementally as imports add rows"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None # Data version the arrays were loaded at
+        self.last_message_id = 0
+        self.timestamps = self.amounts = self.fees = self.balances = None
+        self.category_codes = self.counterparty_codes = None
+        self.categories = [] # code -> category
+        self.counterparties = [] # code -> counterparty name ("" when missing)
+        self._category_index = {}
+        self._counterparty_index = {}
+
+    def __len__(self):
+        return 0 if self.timestamps is None else len(self.timestamps)
+
+    def reset(self):
+        """Drop all loaded arrays"""
+        self.__init__()
+
+    def refresh(self):
+        """Load messages added since the last refresh if the data version has moved on"""
+        version, _ = DataVersion.current()
+        with self.lock:
+            if version == self.version:
+                return
+            if self.timestamps is not None:
+                stored = db.session.query(func.count(Message.message_id)).filter(Message.message_id <= self.last_message_id).scalar()
+                if stored != len(self):
+                    self.reset() # Messages were removed, start over
+            self._load_after(self.last_message_id)
+            self.version = version
+
+    def _encode(self, value, index, values):
+        """Return the dictionary code for value, assigning the next free one if it is new"""
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
+    def _load_after(self, message_id):
+        """Append all messages with an id above message_id to the arrays"""
+        timestamp_column = epoch_seconds(Message.timestamp)
+        statement = select(
+            Message.message_id,
+            timestamp_column if timestamp_column is not None else Message.timestamp,
+            Message.transaction_amount,
+            Message.fee,
+            Message.new_balance,
+            Category.name,
+            Counterparty.name,
+        ).outerjoin(Category, Category.category_id == Message.category_id) \
+         .outerjoin(Counterparty, Counterparty.counterparty_id == Message.counterparty_id) \
+         .where(Message.message_id > message_id).order_by(Message.message_id)
+
+        columns = {name: [] for name in ("timestamps", "amounts", "fees", "balances", "category_codes", "counterparty_codes")}
+        with db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(statement)
+            for rows in result.partitions(LOAD_CHUNK_SIZE):
+                ids, timestamps, amounts, fees, balances, categories, counterparties = zip(*rows)
+                if timestamp_column is None:
+                    timestamps = [int(value.replace(tzinfo=None).timestamp()) for value in timestamps]
+                columns["timestamps"].append(np.array(timestamps, dtype=np.int64))
+                # None becomes NaN, so missing values drop out of the float columns
+                columns["amounts"].append(np.array(amounts, dtype=np.float64))
+                columns["fees"].append(np.array(fees, dtype=np.float64))
+                columns["balances"].append(np.array(balances, dtype=np.float64))
+                columns["category_codes"].append(np.array(
+                    [self._encode(value or "", self._category_index, self.categories) for value in categories], dtype=np.int32))
+                columns["counterparty_codes"].append(np.array(
+                    [self._encode(value or "", self._counterparty_index, self.counterparties) for value in counterparties], dtype=np.int32))
+                self.last_message_id = ids[-1]
+
+        for name, chunks in columns.items():
+            if not chunks:
+                continue
+            existing = getattr(self, name)
+            setattr(self, name, np.concatenate(([existing] if existing is not None else []) + chunks))
+
+    def aggregate(self, bucket="day", metric="count", field="amount", group_by="none",
+                  category=None, start=None, end=None, percentile=50.0):
+        """Group messages by time bucket (and optionally category/counterparty) and aggregate
+
+        Returns {group label: {bucket label: value}}; the group label is "all" without group_by.
+        start and end are datetimes bounding the message timestamps (inclusive).
+        """
+        with self.lock:
+            if not len(self):
+                return {}
+            mask = np.ones(len(self), dtype=bool)
+            if category:
+                code = self._category_index.get(category)
+                if code is None:
+                    return {}
+                mask &= self.category_codes == code
+            if start is not None:
+                mask &= self.timestamps >= to_epoch(start)
+            if end is not None:
+                mask &= self.timestamps <= to_epoch(end)
+
+            timestamps = self.timestamps[mask]
+            values = getattr(self, "balances" if metric == "balance" else FIELDS[field])[mask]
+            if group_by == "category":
+                groups, labels = self.category_codes[mask], self.categories
+            elif group_by == "counterparty":
+                groups, labels = self.counterparty_codes[mask], self.counterparties
+            else:
+                groups, labels = np.zeros(len(timestamps), dtype=np.int32), ["all"]
+
+        buckets = bucket_starts(timestamps, bucket)
+        if metric != "count":
+            # Value metrics only look at messages where the field is present
+            present = ~np.isnan(values)
+            buckets, groups, values, timestamps = buckets[present], groups[present], values[present], timestamps[present]
+        if not len(buckets):
+            return {}
+
+        # One integer key per (group, bucket) pair, then a single vectorized pass per metric
+        first_bucket = buckets.min()
+        span = int(buckets.max() - first_bucket) + 1
+        keys, key_index = np.unique(groups.astype(np.int64) * span + (buckets - first_bucket), return_inverse=True)
+        key_index = key_index.ravel()
+        counts = np.bincount(key_index, minlength=len(keys))
+
+        if metric == "count":
+            result = counts.astype(np.float64)
+        elif metric in ("sum", "mean"):
+            result = np.bincount(key_index, weights=values, minlength=len(keys))
+            if metric == "mean":
+                result = result / counts
+        elif metric in ("min", "max", "percentile"):
+            # Sort values within each key; group k then occupies [starts[k], starts[k] + counts[k])
+            order = np.lexsort((values, key_index))
+            ordered = values[order]
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            if metric == "min":
+                result = ordered[starts]
+            elif metric == "max":
+                result = ordered[starts + counts - 1]
+            else:
+                # Linear interpolation between closest ranks, like np.percentile
+                position = starts + (counts - 1) * (percentile / 100.0)
+                lower = np.floor(position).astype(np.int64)
+                upper = np.ceil(position).astype(np.int64)
+                result = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        else: # balance: the last new_balance reported in each bucket
+            order = np.lexsort((timestamps, key_index))
+            ends = np.cumsum(counts) - 1
+            result = values[order][ends]
+
+        series = {}
+        for key, value in zip(keys.tolist(), result.tolist()):
+            group, offset = divmod(key, span)
+            series.setdefault(labels[group], {})[bucket_label(int(first_bucket) + offset, bucket)] = value
+        return series
+
+column_store = ColumnStore()
+
+def to_epoch(moment):
+    """Wall-clock datetime to epoch seconds, matching how timestamps are loaded"""
+    return int((np.datetime64(moment, "s") - np.datetime64(0, "s")).astype(np.int64))
+
+def bucket_starts(timestamps, bucket):
+    """Epoch seconds of the start of the hour/day/week/month each timestamp falls in"""
+    moments = timestamps.astype("datetime64[s]")
+    if bucket == "hour":
+        starts = moments.astype("datetime64[h]")
+    elif bucket == "day":
+        starts = moments.astype("datetime64[D]")
+    elif bucket == "week":
+        # Weeks start on Monday; 1970-01-01 was a Thursday, three days after a Monday
+        days = moments.astype("datetime64[D]").astype(np.int64)
+        starts = ((days + 3) // 7 * 7 - 3).astype("datetime64[D]")
+    else:
+        starts = moments.astype("datetime64[M]")
+    return starts.astype("datetime64[s]").astype(np.int64)
+
+BUCKET_FORMATS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m"}
+
+def bucket_label(bucket_start, bucket):
+    """Format the start of a bucket for the API response"""
+    return datetime.fromtimestamp(bucket_start, timezone.utc).strftime(BUCKET_FORMATS[bucket])
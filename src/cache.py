@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, make_response
+from src.models.sms import DataVersion
+
+DEFAULT_CACHE_SIZE = 256 # Responses kept per process
+
+class ResponseCache:
+    """Size-bounded LRU of rendered responses, tagged with the data version they were built from"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # key -> (version, status, mimetype, body)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """Return the cached (status, mimetype, body) for key if it was built from this version"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1:]
+
+    def put(self, key, version, status, mimetype, body):
+        with self.lock:
+            self.entries[key] = (version, status, mimetype, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries
+            }
+
+response_cache = ResponseCache()
+
+def init_response_cache(app):
+    """Size the cache from RESPONSE_CACHE_SIZE (0 disables caching)"""
+    response_cache.max_entries = int(app.config.get("RESPONSE_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    response_cache.clear()
+
+def cache_key():
+    """The endpoint plus its query arguments exactly as received
+
+    Arguments are sorted by name only (a stable sort), so the order of different arguments
+    doesn't matter but repeated ones keep theirs: views read the first value of each.
+    """
+    args = tuple(sorted(request.args.items(multi=True), key=lambda item: item[0]))
+    return (request.endpoint, args)
+
+def cached_response(view):
+    """Serve a read endpoint from the cache and answer conditional GETs with 304 Not Modified"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, updated_at = DataVersion.current()
+        key = cache_key()
+        # The data version fully determines the response for a given key, so the ETag
+        # can be checked before anything is computed
+        etag = f"{version}-{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]}"
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        cached = response_cache.get(key, version) if response_cache.max_entries > 0 else None
+        if cached:
+            status, mimetype, body = cached
+            response = current_app.response_class(body, status=status, mimetype=mimetype)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response # Errors are neither cached nor tagged
+            if response_cache.max_entries > 0:
+                response_cache.put(key, version, response.status_code, response.mimetype, response.get_data())
+
+        response.set_etag(etag)
+        if updated_at is not None:
+            response.last_modified = updated_at
+        response.cache_control.no_cache = True # Browsers must revalidate, which costs at most a 304
+        return response.make_conditional(request)
+    return wrapper
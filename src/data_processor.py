@@ -1,171 +1,533 @@
 import xml.etree.ElementTree as ET
+import os
 import re # We will use this for regular expressions later
+import sys
+import time # To measure ingest throughput
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor # To spread extraction across CPU cores
 from datetime import datetime # To convert timestamps
 from src.models.user import db # To access the database instance
-from src.models.sms import Message, Sender, Recipient # To interact with our database models
+from src.models.sms import Message, Sender, Recipient, BodySuffix, ImportCheckpoint, DataVersion # To interact with our database models
+from src.models.sms import LOOKUPS, split_body, to_minor # Compact message storage
+from src.models.rollups import update_rollups
+from src.metrics import StageTimer, ingest_batch_duration, ingest_duration, ingest_messages
 
-def parse_xml_and_populate_db(xml_file_path):
-    """Parse XML file and populate database with SMS data"""
-    print(f"Parsing XML file: {xml_file_path}")
-    
-    try:
-        # Parse the XML file
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot() # Get the root element (<smses>)
-        
-        messages_processed = 0
-        
-        # Iterate through each <sms> element
-        for sms_element in root.findall("sms"):
-            try:
-                # Extract attributes
-                address = sms_element.get("address", "")
-                date_ms = int(sms_element.get("date", "0"))
-                body = sms_element.get("body", "")
-                
-                # Convert timestamp from milliseconds to datetime object
-                timestamp = datetime.fromtimestamp(date_ms / 1000.0)
-                
-                # Categorize and extract data
-                category, transaction_data = categorize_and_extract(body)
-                
-                # Create or get sender
-                sender = Sender.query.filter_by(phone_number=address).first()
-                if not sender:
-                    sender = Sender(phone_number=address)
-                    db.session.add(sender)
-                
-                # Create or get recipient if phone number exists
-                recipient = None
-                if 'recipient_phone' in transaction_data:
-                    recipient = Recipient.query.filter_by(phone_number=transaction_data['recipient_phone']).first()
-                    if not recipient:
-                        recipient = Recipient(
-                            phone_number=transaction_data['recipient_phone'],
-                            name=transaction_data.get('recipient_name')
-                        )
-                        db.session.add(recipient)
-                
-                # Create message
-                message = Message(
-                    sender=sender,
-                    recipient=recipient,
-                    timestamp=timestamp,
-                    message_body=body,
-                    category=category,
-                    transaction_amount=transaction_data.get('amount'),
-                    currency=transaction_data.get('currency'),
-                    status='completed',  # Default status
-                    new_balance=transaction_data.get('new_balance'),
-                    fee=transaction_data.get('fee'),
-                    transaction_id=transaction_data.get('transaction_id'),
-                    recipient_name=transaction_data.get('recipient_name')
-                )
-                
-                db.session.add(message)
-                messages_processed += 1
-                
-                # Commit every 100 messages to avoid memory issues
-                if messages_processed % 100 == 0:
-                    db.session.commit()
-                    print(f"Processed {messages_processed} messages...")
-                
-            except Exception as e:
-                print(f"Error processing SMS: {e}")
-                db.session.rollback()
-                continue # Continue to the next SMS even if one fails
-        
-        # Final commit for remaining messages
+try:
+    import resource # Unix only, used to report peak memory usage after an import
+except ImportError:
+    resource = None
+
+def iter_sms_records(xml_file_path):
+    """Stream (address, date, body) tuples from an SMS backup file (a path or binary file object) one <sms> element at a time"""
+    # iterparse builds the tree incrementally, so we clear every element as soon as it has been
+    # read; memory use then stays flat no matter how many messages the backup contains
+    context = ET.iterparse(xml_file_path, events=("start", "end"))
+    _, root = next(context) # The first event is the start of the root element (<smses>)
+
+    for event, element in context:
+        if event == "end" and element.tag == "sms":
+            yield element.get("address", ""), element.get("date", "0"), element.get("body", "")
+            element.clear()
+            root.clear() # Drop the root's reference to the already processed children
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+DEFAULT_BATCH_SIZE = 5000 # Messages written per bulk insert / transaction
+
+class BulkIngestor:
+    """Buffers extracted messages and writes them to the database in large batches"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, source=None, on_flush=None):
+        self.batch_size = max(1, batch_size)
+        self.pending = [] # Message rows waiting for the next flush
+        self.pending_high_water = 0 # Newest date (ms) among the pending messages
+        self.messages_read = 0 # Messages handed to add()
+        self.messages_written = 0
+        self.messages_skipped = 0 # Messages that were already in the database
+        self.messages_failed = 0 # Messages lost with a batch that could not be written
+        self.errors = [] # One entry per failed batch
+        self.on_flush = on_flush # Called with the ingestor after every flush, to report progress
+        self.timer = StageTimer() # Time spent in parse/extract/write, filled in by import_sms_backup
+        # Resume checkpoint for the backup file being imported, updated with every batch
+        self.source = source
+        checkpoint = ImportCheckpoint.query.filter_by(source=source).first() if source else None
+        self.checkpoint_exists = checkpoint is not None
+        self.high_water_mark = checkpoint.last_date_ms if checkpoint else 0 # Newest <sms> date (ms) committed so far
+        # phone_number -> id caches, so each distinct sender/recipient is looked up only once
+        self.sender_ids = dict(db.session.query(Sender.phone_number, Sender.sender_id).all())
+        self.recipient_ids = dict(db.session.query(Recipient.phone_number, Recipient.recipient_id).all())
+        # name -> id caches for the category/currency/status/counterparty lookup tables,
+        # and text -> id for the shared body suffixes
+        self.lookup_ids = {
+            field: dict(db.session.query(model.name, getattr(model, key_column)).all())
+            for field, model, key_column in LOOKUPS
+        }
+        self.suffix_ids = dict(db.session.query(BodySuffix.text, BodySuffix.suffix_id).all())
+
+    def add(self, address, date_ms, timestamp, body, dedup_key, extracted):
+        """Queue one message and flush once a full batch has been collected"""
+        self.messages_read += 1
+        self.pending_high_water = max(self.pending_high_water, date_ms)
+        self.pending.append({
+            "dedup_key": dedup_key,
+            "sender_phone": address,
+            "recipient_phone": extracted.recipient_phone,
+            "timestamp": timestamp,
+            "message_body": body,
+            "category": extracted.category,
+            "transaction_amount": extracted.amount,
+            "currency": extracted.currency,
+            "status": "completed", # Default status
+            "new_balance": extracted.new_balance,
+            "fee": extracted.fee,
+            "transaction_id": extracted.transaction_id,
+            "recipient_name": extracted.recipient_name,
+        })
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all queued messages in a single transaction"""
+        if not self.pending:
+            return 0
+
+        batch, self.pending = self.pending, []
+        high_water, self.pending_high_water = self.pending_high_water, 0
+        started = time.perf_counter()
+        try:
+            # Drop messages stored by an earlier import, or repeated within this batch
+            known = self._existing_dedup_keys([row["dedup_key"] for row in batch])
+            fresh = []
+            for row in batch:
+                if row["dedup_key"] not in known:
+                    known.add(row["dedup_key"])
+                    fresh.append(row)
+            skipped = len(batch) - len(fresh)
+            batch = fresh
+
+            new_senders = self._insert_missing(
+                Sender, Sender.sender_id, self.sender_ids,
+                {row["sender_phone"]: None for row in batch},
+            )
+            new_recipients = self._insert_missing(
+                Recipient, Recipient.recipient_id, self.recipient_ids,
+                {row["recipient_phone"]: row["recipient_name"] for row in reversed(batch) if row["recipient_phone"]},
+            )
+
+            new_lookups = {
+                field: self._insert_names(model, model.name, getattr(model, key_column), self.lookup_ids[field],
+                                          {row[field] for row in batch if row[field] is not None})
+                for field, model, key_column in LOOKUPS
+            }
+            bodies = [split_body(row["message_body"]) for row in batch]
+            # A suffix gets stored once it is shared: repeated within this batch, or already known
+            suffix_counts = Counter(suffix for _, suffix in bodies if suffix)
+            new_suffixes = self._insert_names(
+                BodySuffix, BodySuffix.text, BodySuffix.suffix_id, self.suffix_ids,
+                {suffix for suffix, count in suffix_counts.items() if count > 1},
+            )
+
+            rows = []
+            for row, (body_text, suffix) in zip(batch, bodies):
+                sender_phone = row["sender_phone"]
+                recipient_phone = row["recipient_phone"]
+                suffix_id = (new_suffixes.get(suffix) or self.suffix_ids.get(suffix)) if suffix else None
+                message = {
+                    "dedup_key": row["dedup_key"],
+                    "sender_id": new_senders.get(sender_phone) or self.sender_ids.get(sender_phone),
+                    "recipient_id": (new_recipients.get(recipient_phone) or self.recipient_ids.get(recipient_phone)) if recipient_phone else None,
+                    "timestamp": row["timestamp"],
+                    "body_text": body_text if suffix_id else row["message_body"],
+                    "body_suffix_id": suffix_id,
+                    "amount_minor": to_minor(row["transaction_amount"]),
+                    "balance_minor": to_minor(row["new_balance"]),
+                    "fee_minor": to_minor(row["fee"]),
+                    "transaction_id": row["transaction_id"],
+                }
+                for field, _, key_column in LOOKUPS:
+                    value = row[field]
+                    message[key_column] = (new_lookups[field].get(value) or self.lookup_ids[field].get(value)) if value is not None else None
+                rows.append(message)
+
+            # One executemany INSERT for the whole batch
+            if batch:
+                db.session.execute(Message.__table__.insert(), rows)
+                update_rollups(batch) # Keep the analytics rollups in step with the messages table
+                DataVersion.bump() # Invalidates cached API responses
+            # The checkpoint commits together with the batch, so an interrupted import
+            # resumes right after the last batch that made it to the database. Once a batch
+            # has failed the mark stays put, so a resumed import reads the failed messages
+            # again (and dedup skips the ones written after them)
+            high_water = self.high_water_mark if self.errors else max(self.high_water_mark, high_water)
+            if self.source:
+                self._save_checkpoint(high_water, len(batch))
+            db.session.commit()
+        except Exception as e:
+            print(f"Error writing batch of {len(batch)} messages: {e}")
+            db.session.rollback()
+            self.messages_failed += len(batch)
+            ingest_messages.inc(len(batch), "failed")
+            self.errors.append(f"Error writing batch of {len(batch)} messages: {e}")
+            if self.on_flush:
+                self.on_flush(self)
+            return 0
+
+        # Only cache ids once the transaction that created them has committed
+        self.sender_ids.update(new_senders)
+        self.recipient_ids.update(new_recipients)
+        for field, ids in new_lookups.items():
+            self.lookup_ids[field].update(ids)
+        self.suffix_ids.update(new_suffixes)
+        self.messages_written += len(batch)
+        self.messages_skipped += skipped
+        ingest_batch_duration.observe(time.perf_counter() - started)
+        ingest_messages.inc(len(batch), "written")
+        ingest_messages.inc(skipped, "skipped")
+        self.high_water_mark = high_water
+        self.checkpoint_exists = self.checkpoint_exists or bool(self.source)
+        print(f"Processed {self.messages_written} messages...")
+        if self.on_flush:
+            self.on_flush(self)
+        return len(batch)
+
+    def _save_checkpoint(self, high_water, messages_added):
+        """Record the high-water mark for this source inside the current transaction"""
+        table = ImportCheckpoint.__table__
+        if self.checkpoint_exists:
+            db.session.execute(
+                table.update()
+                .where(table.c.source == self.source)
+                .values(last_date_ms=high_water, messages_imported=table.c.messages_imported + messages_added, updated_at=datetime.utcnow(), completed_at=None)
+            )
+        else:
+            db.session.execute(table.insert().values(
+                source=self.source, last_date_ms=high_water, messages_imported=messages_added, updated_at=datetime.utcnow()
+            ))
+
+    def mark_complete(self):
+        """Record that the whole file has been imported, so startup doesn't import it again"""
+        if not self.checkpoint_exists:
+            return
+        table = ImportCheckpoint.__table__
+        db.session.execute(table.update().where(table.c.source == self.source).values(completed_at=datetime.utcnow()))
         db.session.commit()
-        print(f"Successfully processed and stored {messages_processed} messages in the database.")
-        return messages_processed
-        
+
+    def _insert_names(self, model, name_column, id_column, cache, names):
+        """Insert lookup values not yet in the cache and return their new ids"""
+        missing = [name for name in names if name not in cache]
+        if not missing:
+            return {}
+        db.session.execute(model.__table__.insert(), [{name_column.key: name} for name in missing])
+        return dict(db.session.query(name_column, id_column).filter(name_column.in_(missing)).all())
+
+    def _existing_dedup_keys(self, keys, chunk_size=500):
+        """Return the subset of keys that are already stored"""
+        existing = set()
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            existing.update(key for key, in db.session.query(Message.dedup_key).filter(Message.dedup_key.in_(chunk)))
+        return existing
+
+    def _insert_missing(self, model, id_column, cache, names_by_phone):
+        """Insert phone numbers not yet in the cache and return their new ids"""
+        missing = {phone: name for phone, name in names_by_phone.items() if phone not in cache}
+        if not missing:
+            return {}
+        db.session.execute(
+            model.__table__.insert(),
+            [{"phone_number": phone, "name": name} for phone, name in missing.items()],
+        )
+        return dict(
+            db.session.query(model.phone_number, id_column)
+            .filter(model.phone_number.in_(list(missing)))
+            .all()
+        )
+
+DEFAULT_WORKERS = 1 # 1 keeps extraction in this process; None uses every CPU core
+DEFAULT_CHUNK_SIZE = 2000 # Messages sent to a worker process at a time
+
+def process_sms_record(address, date_str, body):
+    """Turn one raw (address, date, body) record into the arguments of BulkIngestor.add"""
+    date_ms = int(date_str)
+    # Convert timestamp from milliseconds to datetime object
+    timestamp = datetime.fromtimestamp(date_ms / 1000.0)
+    dedup_key = Message.make_dedup_key(address, date_ms, body)
+    # Categorize and extract data
+    return address, date_ms, timestamp, body, dedup_key, extractor.extract(body)
+
+def extract_chunk(records):
+    """Process a chunk of raw records in a worker process, skipping records that fail"""
+    processed = []
+    for address, date_str, body in records:
+        try:
+            processed.append(process_sms_record(address, date_str, body))
+        except Exception as e:
+            print(f"Error processing SMS: {e}")
+    return processed
+
+def iter_chunks(records, chunk_size):
+    """Group an iterable of records into lists of at most chunk_size"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_processed_records(records, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield processed records from raw SMS records, fanning extraction out to worker processes"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for chunk in iter_chunks(records, chunk_size):
+            yield from extract_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of chunks in flight so memory stays flat, and
+        # hand results to the writer in file order
+        in_flight = deque()
+        for chunk in iter_chunks(records, chunk_size):
+            in_flight.append(executor.submit(extract_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def skip_before(records, high_water_mark):
+    """Drop raw records dated before the high-water mark of a previous import"""
+    for record in records:
+        try:
+            if int(record[1]) < high_water_mark:
+                continue
+        except ValueError:
+            pass # Let extraction report the malformed record
+        yield record
+
+def parse_xml_and_populate_db(xml_file_path, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, source=None, resume=True):
+    """Parse XML file and populate database with SMS data
+
+    Messages already in the database are skipped, so the same or a newer backup can be
+    imported again. Progress is checkpointed per source (the file name by default); with
+    resume=True, messages older than the last committed one are skipped before extraction.
+    Backups list messages by date, so this makes a re-import cost time proportional to the
+    new messages only.
+    """
+    try:
+        return import_sms_backup(xml_file_path, batch_size, workers, chunk_size, source, resume).messages_written
     except Exception as e:
         print(f"Error parsing XML: {e}")
         db.session.rollback()
         return 0
 
+def import_sms_backup(xml_file_path, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, source=None, resume=True, progress=None):
+    """Import an SMS backup and return the BulkIngestor with its counts; parse errors are raised
+
+    progress, if given, is called as progress(ingestor, bytes_read) after every batch.
+    """
+    print(f"Parsing XML file: {xml_file_path}")
+    started = time.perf_counter()
+    with open(xml_file_path, "rb") as xml_file:
+        on_flush = (lambda ingestor: progress(ingestor, xml_file.tell())) if progress else None
+        ingestor = BulkIngestor(batch_size=batch_size, source=source or os.path.basename(xml_file_path), on_flush=on_flush)
+        
+        timer = ingestor.timer
+        
+        # Stream each <sms> element instead of loading the whole backup into memory
+        records = timer.timed("parse", iter_sms_records(xml_file))
+        if resume and ingestor.high_water_mark:
+            print(f"Resuming after messages dated up to {ingestor.high_water_mark}")
+            records = skip_before(records, ingestor.high_water_mark)
+        
+        # Extraction runs in worker processes while this process does all the writes;
+        # with workers, "extract" is the time spent waiting for their results
+        for processed in timer.timed("extract", iter_processed_records(records, workers, chunk_size)):
+            timer.enter("write")
+            ingestor.add(*processed)
+            timer.exit()
+        
+        # Final flush for remaining messages
+        timer.enter("write")
+        ingestor.flush()
+        if not ingestor.errors:
+            ingestor.mark_complete()
+        timer.exit()
+    elapsed = time.perf_counter() - started
+    timer.report()
+    ingest_duration.observe(elapsed)
+    messages_processed = ingestor.messages_written
+    print(f"Successfully processed and stored {messages_processed} messages in the database "
+          f"({ingestor.messages_skipped} already present).")
+    report_ingest_stats(messages_processed, elapsed, timer.seconds)
+    return ingestor
+
+def report_ingest_stats(messages_processed, elapsed, stages=None):
+    """Print throughput, time per stage and peak memory for a finished import"""
+    rate = messages_processed / elapsed if elapsed > 0 else 0.0
+    peak = peak_rss_mb()
+    peak_text = f"{peak:.1f} MB" if peak is not None else "n/a"
+    print(f"Ingest took {elapsed:.2f}s ({rate:,.0f} messages/sec), peak RSS {peak_text}")
+    if stages:
+        print("Stages: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items()))
+
+# --- Extraction Patterns ---
+# Compiled once at import time. Patterns that begin with a keyword only run when the lowercase
+# body contains that keyword, and start searching at its first occurrence.
+
+AMOUNT_NUMBER = r'(\d+(?:,\d+)*(?:\.\d+)?)'
+
+# Transaction amount (e.g., "1,000 RWF", "5000RWF")
+AMOUNT_RE = re.compile(AMOUNT_NUMBER + r'\s*rwf', re.IGNORECASE)
+# New balance (e.g., "New balance: 10,000 RWF")
+BALANCE_RE = re.compile(r'(?:new balance|balance)[:\s]*' + AMOUNT_NUMBER + r'\s*rwf', re.IGNORECASE)
+# Fee (e.g., "Fee: 50 RWF")
+FEE_RE = re.compile(r'fee[:\s]*' + AMOUNT_NUMBER + r'\s*rwf', re.IGNORECASE)
+# Transaction ID (e.g., "TxID: 123456789")
+TXID_RE = re.compile(r'(?:txid|transaction id)[:\s]*(\d+)', re.IGNORECASE)
+# Recipient phone (a Rwandan mobile number: 250 followed by 9 digits)
+PHONE_RE = re.compile(r"\(?(250\d{9})\)?")
+
+# Recipient name patterns, tried in order
+NAME_PATTERNS = [
+    (re.compile(r'(?:to|from)\s+([A-Za-z\s]+?)(?:\s+\d+|\s+\(|$)', re.IGNORECASE), ("to", "from")),  # e.g., "to Jane Smith", "from John Doe"
+    (re.compile(r">(?:payment|sent).*?to\s+([A-Za-z\s]+?)(?:\s+\d+|\s+has)", re.IGNORECASE), (">",)),  # e.g., "payment to Jane Smith has been..."
+    (re.compile(r"transferred to\s+([A-Za-z\s]+?)(?:\s+\(|$)", re.IGNORECASE), ("transferred to",)),  # e.g., "transferred to John Doe (250...)"
+]
+
+# --- Categorization Rules ---
+# The order of these rules matters! More specific rules come before general ones.
+# A rule matches when every keyword of at least one of its keyword groups is in the body.
+CATEGORY_RULES = [
+    ("Incoming Money", [("you have received",)]),
+    ("Payments to Code Holders", [("your payment", "completed")]),
+    ("Bank Deposits", [("bank deposit",)]),
+    ("Transfers to Mobile Numbers", [("transferred to",)]),
+    ("Withdrawals from Agents", [("withdrawn",)]),
+    ("Airtime Bill Payments", [("airtime",)]),
+    ("Cash Power Bill Payments", [("cash power",)]),
+    ("Transactions Initiated by Third Parties", [("one-time password",), ("otp",)]), # OTPs often indicate third-party service interaction
+    ("Direct Payments", [("direct payment",)]),
+    ("Bank Transfers", [("bank transfer",)]),
+    ("Internet and Voice Bundle Purchases", [("internet bundle",), ("voice bundle",)]),
+]
+DEFAULT_CATEGORY = "Other" # Fallback category for messages that don't match any specific pattern
+
+class ExtractionResult:
+    """Category and transaction details extracted from one SMS body"""
+    __slots__ = ("category", "amount", "currency", "new_balance", "fee", "transaction_id", "recipient_name", "recipient_phone")
+
+    FIELDS = __slots__[1:]
+
+    def __init__(self, category=DEFAULT_CATEGORY):
+        self.category = category
+        self.amount = None
+        self.currency = None
+        self.new_balance = None
+        self.fee = None
+        self.transaction_id = None
+        self.recipient_name = None
+        self.recipient_phone = None
+
+    def to_dict(self):
+        """Return the extracted fields as a dict holding only the fields that were found"""
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+def _first_index(body, keywords):
+    """Return the lowest index at which any of the keywords occurs in body, or -1"""
+    first = -1
+    for keyword in keywords:
+        index = body.find(keyword)
+        if index >= 0 and (first < 0 or index < first):
+            first = index
+    return first
+
+class MessageExtractor:
+    """Classifies SMS bodies and extracts transaction details with precompiled patterns"""
+
+    def __init__(self, rules=CATEGORY_RULES, default_category=DEFAULT_CATEGORY):
+        self.rules = [(category, [tuple(group) for group in groups]) for category, groups in rules]
+        self.default_category = default_category
+
+    def categorize(self, body_lower):
+        """Return the category for an already lowercased message body"""
+        # Substring checks short-circuit on the first matching rule, which profiles faster than
+        # scanning the body for every keyword with a combined regex alternation
+        for category, groups in self.rules:
+            for group in groups:
+                for keyword in group:
+                    if keyword not in body_lower:
+                        break
+                else:
+                    return category
+        return self.default_category
+
+    def extract(self, message_body):
+        """Categorize one SMS body and extract its transaction details"""
+        body = message_body.lower() # Lowercase copy for keyword checks
+        result = ExtractionResult(self.categorize(body))
+        # Keyword offsets in the lowercase copy can only be reused on the original when
+        # lowercasing didn't change the length (always true for ASCII text)
+        aligned = len(body) == len(message_body)
+
+        if "rwf" in body:
+            amount_match = AMOUNT_RE.search(message_body)
+            if amount_match:
+                result.amount = float(amount_match.group(1).replace(',', '')) # Remove commas for conversion to float
+                result.currency = 'RWF'
+
+            index = body.find("balance")
+            if index >= 0:
+                # The match may begin with "new " just before the keyword
+                balance_match = BALANCE_RE.search(message_body, max(index - 4, 0) if aligned else 0)
+                if balance_match:
+                    result.new_balance = float(balance_match.group(1).replace(',', ''))
+
+            index = body.find("fee")
+            if index >= 0:
+                fee_match = FEE_RE.search(message_body, index if aligned else 0)
+                if fee_match:
+                    result.fee = float(fee_match.group(1).replace(',', ''))
+
+        index = _first_index(body, ("txid", "transaction id"))
+        if index >= 0:
+            txid_match = TXID_RE.search(message_body, index if aligned else 0)
+            if txid_match:
+                result.transaction_id = txid_match.group(1)
+
+        for pattern, keywords in NAME_PATTERNS:
+            index = _first_index(body, keywords)
+            if index < 0:
+                continue
+            name_match = pattern.search(message_body, index if aligned else 0)
+            if name_match:
+                name = name_match.group(1).strip()
+                # Basic validation to avoid capturing just numbers or very short strings
+                if len(name) > 2 and not name.isdigit():
+                    result.recipient_name = name
+                    break
+
+        index = message_body.find("250")
+        if index >= 0:
+            # The number may be wrapped in parentheses
+            phone_match = PHONE_RE.search(message_body, max(index - 1, 0))
+            if phone_match:
+                result.recipient_phone = phone_match.group(1)
+
+        return result
+
+# Shared extractor used by the ingest pipeline
+extractor = MessageExtractor()
+
 def categorize_and_extract(message_body):
     """Categorize SMS message and extract transaction details"""
-    body = message_body.lower() # Convert to lowercase for easier matching
-    transaction_data = {} # Dictionary to store extracted details
-    category = "Other" # Default category if no specific pattern matches
-
-    # --- Extraction of Common Transaction Details ---
-
-    # Extract transaction amount (e.g., "1,000 RWF", "5000RWF")
-    # This regex looks for numbers (with optional commas and decimals) followed by "rwf"
-    amount_match = re.search(r'(\d+(?:,\d+)*(?:\.\d+)?)\s*rwf', message_body, re.IGNORECASE)
-    if amount_match:
-        amount_str = amount_match.group(1).replace(',', '') # Remove commas for conversion to float
-        transaction_data['amount'] = float(amount_str)
-        transaction_data['currency'] = 'RWF'
-
-    # Extract new balance (e.g., "New balance: 10,000 RWF")
-    balance_match = re.search(r'(?:new balance|balance)[:\s]*(\d+(?:,\d+)*(?:\.\d+)?)\s*rwf', message_body, re.IGNORECASE)
-    if balance_match:
-        balance_str = balance_match.group(1).replace(',', '')
-        transaction_data['new_balance'] = float(balance_str)
-
-    # Extract fee (e.g., "Fee: 50 RWF")
-    fee_match = re.search(r'fee[:\s]*(\d+(?:,\d+)*(?:\.\d+)?)\s*rwf', message_body, re.IGNORECASE)
-    if fee_match:
-        fee_str = fee_match.group(1).replace(',', '')
-        transaction_data['fee'] = float(fee_str)
-
-    # Extract transaction ID (e.g., "TxID: 123456789")
-    txid_match = re.search(r'(?:txid|transaction id)[:\s]*(\d+)', message_body, re.IGNORECASE)
-    if txid_match:
-        transaction_data['transaction_id'] = txid_match.group(1)
-
-    # Extract recipient name (more complex, as it can appear in various contexts)
-    name_patterns = [
-        r'(?:to|from)\s+([A-Za-z\s]+?)(?:\s+\d+|\s+\(|$)',  # e.g., "to Jane Smith", "from John Doe"
-        r">(?:payment|sent).*?to\s+([A-Za-z\s]+?)(?:\s+\d+|\s+has)",  # e.g., "payment to Jane Smith has been..."
-        r"transferred to\s+([A-Za-z\s]+?)(?:\s+\(|$)"  # e.g., "transferred to John Doe (250...)"
-    ]
-
-    for pattern in name_patterns:
-        name_match = re.search(pattern, message_body, re.IGNORECASE)
-        if name_match:
-            name = name_match.group(1).strip()
-            # Basic validation to avoid capturing just numbers or very short strings
-            if len(name) > 2 and not name.isdigit():
-                transaction_data["recipient_name"] = name
-                break
-
-    # Extract recipient phone (looks for a Rwandan mobile number pattern: 250 followed by 9 digits)
-    phone_match = re.search(r"\(?(250\d{9})\)?", message_body)
-    if phone_match:
-        transaction_data["recipient_phone"] = phone_match.group(1)
-
-    # --- Categorization Logic ---
-    # This is where we define rules to assign a category based on keywords in the message body.
-    # The order of these `if/elif` statements matters! More specific rules should come before general ones.
-
-    if "you have received" in body:
-        category = "Incoming Money"
-    elif "your payment" in body and "completed" in body:
-        category = "Payments to Code Holders"
-    elif "bank deposit" in body:
-        category = "Bank Deposits"
-    elif "transferred to" in body:
-        category = "Transfers to Mobile Numbers"
-    elif "withdrawn" in body:
-        category = "Withdrawals from Agents"
-    elif "airtime" in body:
-        category = "Airtime Bill Payments"
-    elif "cash power" in body:
-        category = "Cash Power Bill Payments"
-    elif "one-time password" in body or "otp" in body:
-        category = "Transactions Initiated by Third Parties" # OTPs often indicate third-party service interaction
-    elif "direct payment" in body:
-        category = "Direct Payments"
-    elif "bank transfer" in body:
-        category = "Bank Transfers"
-    elif "internet bundle" in body or "voice bundle" in body:
-        category = "Internet and Voice Bundle Purchases"
-    else:
-        category = "Other" # Fallback category for messages that don't match any specific pattern
-
-    return category, transaction_data
\ No newline at end of file
+    result = extractor.extract(message_body)
+    return result.category, result.to_dict()
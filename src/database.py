@@ -0,0 +1,76 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Database performance profiles:
+#   "tuned" - WAL and pragmas on SQLite, a pool of reusable connections everywhere (the default)
+#   "plain" - SQLAlchemy's defaults: rollback journal, and a new SQLite connection per checkout
+PROFILES = ("tuned", "plain")
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_BUSY_TIMEOUT_MS = 5000 # How long a writer waits for another writer before "database is locked"
+
+def sqlite_pragmas(config):
+    """The PRAGMA statements run on every new SQLite connection"""
+    return [
+        # Readers see the last committed data while an import writes, instead of waiting for it
+        "PRAGMA journal_mode=WAL",
+        # In WAL mode NORMAL only fsyncs at checkpoints; a power cut may lose the last commits but never corrupts the file
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        # Negative cache_size is in KiB
+        f"PRAGMA cache_size=-{int(config.get('SQLITE_CACHE_SIZE_KB', 65536))}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE_MB', 256)) * 1024 * 1024}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', DEFAULT_BUSY_TIMEOUT_MS))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+def configure_database(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS for the configured profile; call before db.init_app(app)"""
+    profile = app.config.get('DATABASE_PROFILE', 'tuned')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DATABASE_PROFILE {profile!r}, use one of: {', '.join(PROFILES)}")
+    if profile == 'plain':
+        return
+
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    pool_size = int(app.config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+    max_overflow = int(app.config.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW))
+
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return # In-memory databases live and die with their single connection
+        # SQLAlchemy 1.4 opens a new connection per checkout for SQLite files; pool them like any
+        # other database. Connections move between request threads, which is safe here because
+        # each one is only used by one thread at a time.
+        options.setdefault('poolclass', QueuePool)
+        options.setdefault('pool_size', pool_size)
+        options.setdefault('max_overflow', max_overflow)
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.setdefault('check_same_thread', False)
+    else:
+        # PostgreSQL and friends already pool; size the pool and drop connections the server closed
+        options.setdefault('pool_size', pool_size)
+        options.setdefault('max_overflow', max_overflow)
+        options.setdefault('pool_pre_ping', True)
+        options.setdefault('pool_recycle', 1800)
+
+def init_database_profile(app, db):
+    """Apply the per-connection settings of the profile; call after db.init_app(app)"""
+    if app.config.get('DATABASE_PROFILE', 'tuned') == 'plain':
+        return
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
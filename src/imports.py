@@ -0,0 +1,189 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl # Unix only, serializes database writers between processes
+except ImportError:
+    fcntl = None
+
+# Threads that run uploaded imports. Imports take turns on the writer lock, so with more
+# than one, queued jobs only start waiting for the lock sooner.
+DEFAULT_IMPORT_WORKERS = 1
+MAX_FINISHED_JOBS = 100 # Finished jobs kept around for polling
+DEFAULT_LOCK_FILE = os.path.join(tempfile.gettempdir(), 'momo-bootstrap.lock')
+
+_writer_threads = threading.Lock() # Only one import at a time within this process
+
+@contextmanager
+def writer_lock(lock_file=DEFAULT_LOCK_FILE):
+    """Hold the database writer lock for an import or the startup bootstrap
+
+    BulkIngestor caches ids for the whole import, so two imports writing at once would
+    insert the same senders, lookups and checkpoints twice. The lock is taken in this
+    process and, where fcntl is available, on lock_file for the other processes.
+    """
+    with _writer_threads:
+        if fcntl is None:
+            yield
+            return
+        with open(lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+class ImportJob:
+    """Status and progress counters of one uploaded backup being imported"""
+
+    def __init__(self, filename, path, total_bytes):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path # Spooled upload on disk, removed once the import finishes
+        self.status = "queued" # queued -> running -> completed | failed
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.messages_read = 0
+        self.messages_written = 0
+        self.messages_skipped = 0
+        self.messages_failed = 0
+        self.errors = []
+        self.stage_seconds = {} # parse/extract/write -> seconds so far
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None # perf_counter() at start, for throughput
+        self._elapsed = None # Seconds the import took, once finished
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed")
+
+    def update(self, ingestor, bytes_read):
+        """Copy the counters of a running BulkIngestor"""
+        self.bytes_read = bytes_read
+        self.messages_read = ingestor.messages_read
+        self.messages_written = ingestor.messages_written
+        self.messages_skipped = ingestor.messages_skipped
+        self.messages_failed = ingestor.messages_failed
+        self.errors = list(ingestor.errors)
+        self.stage_seconds = dict(ingestor.timer.seconds)
+
+    def to_dict(self):
+        elapsed = self._elapsed
+        if elapsed is None and self._started is not None:
+            elapsed = time.perf_counter() - self._started
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': round(self.bytes_read / self.total_bytes, 4) if self.total_bytes else (1.0 if self.finished else 0.0),
+            'bytes_read': self.bytes_read,
+            'total_bytes': self.total_bytes,
+            'messages_read': self.messages_read,
+            'messages_written': self.messages_written,
+            'messages_skipped': self.messages_skipped,
+            'messages_failed': self.messages_failed,
+            'messages_per_second': round(self.messages_read / elapsed, 1) if elapsed else 0.0,
+            'elapsed_seconds': round(elapsed, 3) if elapsed is not None else None,
+            'stage_seconds': {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+            'errors': self.errors,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ImportJobManager:
+    """Runs uploaded backups through the ingest pipeline on background threads
+
+    Jobs are kept in the memory of this process, so with several server processes a
+    job can only be polled from the one that accepted the upload.
+    """
+
+    def __init__(self, max_workers=DEFAULT_IMPORT_WORKERS):
+        self.max_workers = max_workers
+        self.executor = None # Created on the first submit, so importing this module starts no threads
+        self.jobs = OrderedDict() # id -> ImportJob, oldest first
+        self.lock = threading.Lock()
+        self.upload_folder = os.path.join(tempfile.gettempdir(), 'momo-imports')
+        self.lock_file = DEFAULT_LOCK_FILE
+
+    def submit(self, app, upload):
+        """Spool an uploaded file (a werkzeug FileStorage) to disk and queue its import"""
+        os.makedirs(self.upload_folder, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.xml', dir=self.upload_folder)
+        with os.fdopen(fd, 'wb') as spool:
+            upload.save(spool) # Copies the request stream in chunks, never the whole file in memory
+        job = ImportJob(os.path.basename(upload.filename or 'upload.xml'), path, os.path.getsize(path))
+
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='import')
+        self.executor.submit(self._run, app, job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self, app, job):
+        """Import one job inside its own app context (and so its own database session)"""
+        # Imported here so serving processes only load the ingest pipeline once an upload arrives
+        from src.data_processor import import_sms_backup, DEFAULT_WORKERS, DEFAULT_CHUNK_SIZE
+        status = "failed"
+        try:
+            with writer_lock(self.lock_file), app.app_context():
+                job.started_at = datetime.utcnow() # The job stays queued while another import holds the lock
+                job._started = time.perf_counter()
+                job.status = "running"
+                ingestor = import_sms_backup(
+                    job.path,
+                    workers=app.config.get('INGEST_WORKERS', DEFAULT_WORKERS),
+                    chunk_size=app.config.get('INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE),
+                    # Uploads may share a file name without being the same backup, so every
+                    # message goes through deduplication instead of the date checkpoint
+                    source=f"upload:{job.filename}",
+                    resume=False,
+                    progress=job.update
+                )
+            job.update(ingestor, job.total_bytes)
+            # A job only fails outright if nothing could be written; partial failures are listed in errors
+            if not ingestor.errors or ingestor.messages_written:
+                status = "completed"
+        except Exception as e:
+            print(f"Error importing {job.filename}: {e}")
+            job.errors = job.errors + [f"Error parsing XML: {e}"]
+        finally:
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+            job._elapsed = time.perf_counter() - job._started if job._started is not None else 0.0
+            job.finished_at = datetime.utcnow()
+            job.status = status
+
+import_jobs = ImportJobManager()
+
+def init_import_jobs(app):
+    """Configure the import pool from IMPORT_WORKERS, IMPORT_UPLOAD_FOLDER and BOOTSTRAP_LOCK_FILE"""
+    import_jobs.max_workers = max(1, int(app.config.get('IMPORT_WORKERS', DEFAULT_IMPORT_WORKERS)))
+    import_jobs.upload_folder = app.config.get('IMPORT_UPLOAD_FOLDER', import_jobs.upload_folder)
+    import_jobs.lock_file = app.config.get('BOOTSTRAP_LOCK_FILE', import_jobs.lock_file)
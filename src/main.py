@@ -1,15 +1,22 @@
 import os
 import sys
+import tempfile
+from datetime import datetime
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS # Import CORS for cross-origin requests
+
 from src.models.user import db # Import the shared db instance
-from src.models.sms import Message, Sender, Recipient # Import our new SMS models
+from src.database import configure_database, init_database_profile
+from src.models.sms import Message, Sender, Recipient, ImportCheckpoint # Import our new SMS models
 from src.routes.user import user_bp
 from src.routes.sms import sms_bp # We will create this later for API endpoints
-from src.data_processor import parse_xml_and_populate_db # Import our data processing function
+from src.routes.imports import imports_bp
+from src.cache import init_response_cache
+from src.imports import init_import_jobs, writer_lock
+from src.metrics import init_metrics
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
@@ -29,6 +36,7 @@ CORS(app, resources={
 
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(sms_bp, url_prefix='/api/v1')
+app.register_blueprint(imports_bp, url_prefix='/api/v1')
 
 # Configure the SQLite database
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
@@ -36,7 +44,33 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
     f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False # Suppresses a warning
+# "tuned" (WAL, pragmas and pooled connections) or "plain" (SQLAlchemy defaults), see src/database.py
+app.config['DATABASE_PROFILE'] = os.environ.get('DATABASE_PROFILE', 'tuned')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+app.config['SQLITE_MMAP_SIZE_MB'] = int(os.environ.get('SQLITE_MMAP_SIZE_MB', 256))
+# Number of API responses cached per process; 0 disables the cache
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+# INGEST_WORKERS > 1 spreads message extraction over that many processes
+app.config['INGEST_WORKERS'] = int(os.environ.get('INGEST_WORKERS', 1))
+app.config['INGEST_CHUNK_SIZE'] = int(os.environ.get('INGEST_CHUNK_SIZE', 2000))
+# Uploaded backups (POST /api/v1/imports) are spooled here and imported by IMPORT_WORKERS background threads
+app.config['IMPORT_WORKERS'] = int(os.environ.get('IMPORT_WORKERS', 1))
+if os.environ.get('IMPORT_UPLOAD_FOLDER'):
+    app.config['IMPORT_UPLOAD_FOLDER'] = os.environ['IMPORT_UPLOAD_FOLDER']
+# Database writers take turns on this lock: processes starting together (so only the first one
+# upgrades and loads the database) and uploaded imports, in this process and in others
+app.config['BOOTSTRAP_LOCK_FILE'] = os.environ.get('BOOTSTRAP_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'momo-bootstrap.lock'))
+# SLOW_QUERY_MS > 0 prints every SQL statement at least that slow, with its query plan
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 0))
+configure_database(app)
 db.init_app(app) # Initialize SQLAlchemy with our Flask app
+init_database_profile(app, db)
+init_response_cache(app)
+init_import_jobs(app)
+init_metrics(app) # Request timings, SQL statement counts and the /metrics endpoint
 
 @app.route('/', defaults={'path': ''}) # Route for serving static files (frontend)
 @app.route('/<path:path>')
@@ -54,27 +88,68 @@ def serve(path):
         else:
             return "index.html not found", 404
 
+def bootstrap_lock():
+    """Hold the writer lock on BOOTSTRAP_LOCK_FILE (in-process only where fcntl is unavailable)"""
+    return writer_lock(app.config['BOOTSTRAP_LOCK_FILE'])
+
+def needs_import(xml_file_path):
+    """Decide whether the bundled backup has to be (re)loaded, using single-row lookups only"""
+    checkpoint = ImportCheckpoint.query.filter_by(source=os.path.basename(xml_file_path)).first()
+    if checkpoint is None:
+        # Databases loaded before checkpoints existed have messages but no checkpoint
+        return db.session.query(Message.message_id).first() is None
+    # Resume an interrupted import, or pick up a backup file replaced since the last one finished
+    if checkpoint.completed_at is None:
+        return True
+    return datetime.utcfromtimestamp(os.path.getmtime(xml_file_path)) > checkpoint.completed_at
+
 def initialize_database():
-    """Initialize database and load data if needed"""
-    with app.app_context(): # This ensures we are within the Flask application context
-        db.create_all() # Creates all tables defined by our models (Sender, Recipient, Message)
+    """Initialize database and load data if needed
+
+    Safe to run in every process: the work happens under a file lock, and each step starts
+    with a cheap probe, so once one process has done it the others return in milliseconds.
+    """
+    with app.app_context(), bootstrap_lock(): # This ensures we are within the Flask application context
+        # Imported here so processes that only serve requests never load them
+        from src.models.migrations import schema_is_current, upgrade_schema
+        if not schema_is_current():
+            upgrade_schema() # Creates all tables defined by our models and upgrades older databases
         
-        # Check if data already exists in the Message table
-        message_count = Message.query.count()
-        if message_count == 0:
-            print("No data found. Loading SMS data from XML...")
-            # Construct the absolute path to your XML file
-            xml_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'modified_sms_v2.xml')
-            if os.path.exists(xml_file_path):
-                parse_xml_and_populate_db(xml_file_path) # Call our data processing function
-                print("Data loading completed.")
-            else:
-                print(f"XML file not found at {xml_file_path}")
-        else:
-            print(f"Database already contains {message_count} messages.")
+        # Construct the absolute path to your XML file
+        xml_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'modified_sms_v2.xml')
+        if not os.path.exists(xml_file_path):
+            print(f"XML file not found at {xml_file_path}")
+            return
+        if not needs_import(xml_file_path):
+            return
+        
+        # Import is incremental: messages already in the database are skipped, and a
+        # checkpoint lets an interrupted or repeated import pick up where it left off
+        print("Loading new SMS data from XML...")
+        from src.data_processor import parse_xml_and_populate_db
+        parse_xml_and_populate_db(
+            xml_file_path,
+            workers=app.config['INGEST_WORKERS'],
+            chunk_size=app.config['INGEST_CHUNK_SIZE']
+        )
+        print("Data loading completed.")
+
+@app.cli.command('bootstrap')
+def bootstrap_command():
+    """Create or upgrade the database and load the bundled backup, then exit"""
+    initialize_database()
+
+# For servers that import the app directly (e.g. gunicorn src.main:app): BOOTSTRAP_ON_START=1
+# bootstraps from the first worker, the others wait on the lock and then find nothing to do.
+# This runs the whole import while the worker boots, so only use it with small backups or with
+# gunicorn --preload (once, in the master); otherwise run python main.py bootstrap beforehand
+if os.environ.get('BOOTSTRAP_ON_START') == '1':
+    initialize_database()
 
 if __name__ == '__main__':
     initialize_database() # Call the database initialization function when the script runs
+    if sys.argv[1:] == ['bootstrap']:
+        sys.exit(0) # python main.py bootstrap: prepare the database without starting the server
     
     # Get port from environment variable or use default
     port = int(os.environ.get('PORT', 5000))
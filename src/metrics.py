@@ -0,0 +1,274 @@
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.cache import response_cache
+
+# Upper bounds of the histogram buckets, Prometheus' defaults for latencies in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def format_labels(names, values, extra=()):
+    """Render {name="value",...} for a label set (empty string without labels)"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {} # label values -> total
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, format_labels(self.labels, key), value) for key, value in sorted(self.values.items())]
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, rendered like a Prometheus client would"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.values = {} # label values -> [per-bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", format_labels(self.labels, key, [("le", format_value(bound))]), cumulative))
+                samples.append((f"{self.name}_sum", format_labels(self.labels, key), total))
+                samples.append((f"{self.name}_count", format_labels(self.labels, key), count))
+        return samples
+
+class MetricsRegistry:
+    """The metrics of this process, plus collectors that report values kept elsewhere"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = [] # Callables returning [(name, kind, help, [(labels dict, value)])]
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in metric.samples())
+        for collect in self.collectors:
+            for name, kind, help_text, values in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{format_labels(list(labels), list(labels.values()))} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests", ("method", "endpoint", "status"))
+request_statements = registry.histogram(
+    "http_request_db_statements", "SQL statements issued per HTTP request", ("endpoint",), STATEMENT_BUCKETS)
+request_db_duration = registry.histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per HTTP request", ("endpoint",))
+slow_queries = registry.counter(
+    "db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS", ("endpoint",))
+ingest_stage_seconds = registry.counter(
+    "ingest_stage_seconds_total", "Time spent in each ingest stage", ("stage",))
+ingest_messages = registry.counter(
+    "ingest_messages_total", "Messages handled by imports, by outcome", ("outcome",))
+ingest_batch_duration = registry.histogram(
+    "ingest_batch_duration_seconds", "Time to write one batch of messages")
+ingest_duration = registry.histogram(
+    "ingest_duration_seconds", "Time taken by whole imports", buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+
+class StageTimer:
+    """Accumulates wall time per named stage; a nested stage pauses the one around it"""
+
+    def __init__(self):
+        self.seconds = {} # stage -> seconds
+        self.stack = []
+        self.switched_at = None
+
+    def enter(self, stage):
+        now = time.perf_counter()
+        if self.stack:
+            self._charge(self.stack[-1], now)
+        self.stack.append(stage)
+        self.switched_at = now
+
+    def exit(self):
+        now = time.perf_counter()
+        self._charge(self.stack.pop(), now)
+        self.switched_at = now
+
+    def _charge(self, stage, now):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + (now - self.switched_at)
+
+    def timed(self, stage, iterable):
+        """Yield from iterable, charging the time spent producing each item to stage"""
+        iterator = iter(iterable)
+        while True:
+            self.enter(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.exit()
+            yield item
+
+    def report(self):
+        """Add the stage totals to the ingest metrics"""
+        for stage, seconds in self.seconds.items():
+            ingest_stage_seconds.inc(seconds, stage)
+
+# --- Request and SQL instrumentation ---
+
+slow_query_threshold = None # Seconds; None leaves the slow-query log off
+
+def request_label():
+    """Low-cardinality endpoint label: the matched URL rule, not the concrete path"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    in_request = has_request_context()
+    if in_request:
+        g.sql_statements = g.get("sql_statements", 0) + 1
+        g.sql_seconds = g.get("sql_seconds", 0.0) + elapsed
+    if slow_query_threshold is not None and elapsed >= slow_query_threshold and not executemany:
+        endpoint = request_label() if in_request else "background"
+        slow_queries.inc(1, endpoint)
+        log_slow_query(conn, cursor, statement, parameters, elapsed, endpoint)
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute doesn't run for a failed statement, so drop its start time here
+    connection = context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+def log_slow_query(conn, cursor, statement, parameters, elapsed, endpoint):
+    """Print a slow statement with its query plan"""
+    print(f"Slow query ({elapsed * 1000:.1f} ms, {endpoint}): {' '.join(statement.split())}")
+    print(f"    parameters: {parameters}")
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return
+    dialect = conn.dialect.name
+    prefix = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}.get(dialect)
+    if prefix is None:
+        return
+    try:
+        # A separate DB-API cursor, so the plan lookup is neither counted nor logged itself
+        plan_cursor = cursor.connection.cursor()
+        try:
+            plan_cursor.execute(prefix + statement, parameters)
+            for row in plan_cursor.fetchall():
+                print(f"    -> {row[-1]}")
+        finally:
+            plan_cursor.close()
+    except Exception as e:
+        print(f"    (no plan: {e})")
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+
+def _finish_request(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request_label()
+    statements, sql_seconds = g.get("sql_statements", 0), g.get("sql_seconds", 0.0)
+    request_duration.observe(elapsed, request.method, endpoint, str(response.status_code))
+    request_statements.observe(statements, endpoint)
+    request_db_duration.observe(sql_seconds, endpoint)
+    # Shows up in the browser's network panel; streamed bodies are still being produced at this point
+    response.headers["Server-Timing"] = f'app;dur={elapsed * 1000:.1f}, db;dur={sql_seconds * 1000:.1f};desc="{statements} statements"'
+    return response
+
+def cache_metrics():
+    """Response cache counters for this process"""
+    stats = response_cache.stats()
+    return [
+        ("response_cache_hits_total", "counter", "Responses served from the cache", [({}, stats["hits"])]),
+        ("response_cache_misses_total", "counter", "Cache lookups that had to build the response", [({}, stats["misses"])]),
+        ("response_cache_evictions_total", "counter", "Responses evicted to stay within RESPONSE_CACHE_SIZE", [({}, stats["evictions"])]),
+        ("response_cache_entries", "gauge", "Responses currently cached", [({}, stats["entries"])]),
+    ]
+
+def metrics_view():
+    """Prometheus scrape endpoint"""
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def init_metrics(app):
+    """Time every request, count its SQL statements and expose /metrics
+
+    SLOW_QUERY_MS > 0 turns on the slow-query log: statements at least that slow are
+    printed together with their query plan.
+    """
+    global slow_query_threshold
+    threshold = float(app.config.get("SLOW_QUERY_MS") or 0)
+    slow_query_threshold = threshold / 1000.0 if threshold > 0 else None
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    if cache_metrics not in registry.collectors:
+        registry.collectors.append(cache_metrics)
@@ -0,0 +1,226 @@
+from datetime import datetime
+from sqlalchemy import MetaData, column, inspect, select, table, text
+from sqlalchemy.exc import DBAPIError
+from src.models.user import db # Import the shared db instance
+from src.models.sms import Message, Sender, BodySuffix, DailyRollup, DataVersion, SchemaVersion, LOOKUPS, MINOR_UNITS, split_body
+from src.models.search import create_search_index, drop_search_index
+from src.models.rollups import rebuild_rollups
+
+# Bump whenever upgrade_schema() learns a new step, so existing databases run it once
+SCHEMA_VERSION = 2
+
+def upgrade_schema():
+    """Create missing tables and bring databases made by older versions up to date"""
+    db.create_all() # Creates any table that doesn't exist yet
+    add_message_dedup_keys()
+    add_checkpoint_completed_at()
+    compact_messages()
+    create_missing_indexes()
+    drop_obsolete_indexes()
+    create_search_index()
+    backfill_rollups()
+    set_schema_version(SCHEMA_VERSION)
+
+def schema_is_current():
+    """Return True if the database was already upgraded to SCHEMA_VERSION (a primary key lookup)"""
+    try:
+        with db.engine.connect() as connection:
+            version = connection.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+    except DBAPIError:
+        return False # No schema_version table: a new database or one made by an older version
+    return version == SCHEMA_VERSION
+
+def set_schema_version(version):
+    versions = SchemaVersion.__table__
+    values = {"version": version, "upgraded_at": datetime.utcnow()}
+    if db.session.execute(versions.update().where(versions.c.id == 1).values(**values)).rowcount == 0:
+        db.session.execute(versions.insert().values(id=1, **values))
+    db.session.commit()
+
+def message_columns():
+    """Return the column names of the messages table as it exists in the database"""
+    return table_columns("messages")
+
+def table_columns(table_name):
+    """Return the column names of a table as it exists in the database"""
+    return {column["name"] for column in inspect(db.engine).get_columns(table_name)}
+
+def add_message_dedup_keys():
+    """Add and backfill messages.dedup_key on databases created before incremental ingest"""
+    if "dedup_key" in message_columns():
+        return
+
+    print("Upgrading schema: adding messages.dedup_key...")
+    db.session.execute(text("ALTER TABLE messages ADD COLUMN dedup_key VARCHAR(40)"))
+
+    # Databases this old still have the original messages layout, so read it without the model
+    messages = table("messages", column("message_id"), column("sender_id"), column("timestamp", db.DateTime), column("message_body"))
+    rows = db.session.query(messages.c.message_id, Sender.phone_number, messages.c.timestamp, messages.c.message_body) \
+                     .outerjoin(Sender, messages.c.sender_id == Sender.sender_id) \
+                     .order_by(messages.c.message_id)
+    seen = set()
+    updates = []
+    for message_id, sender_phone, timestamp, body in rows.yield_per(5000):
+        key = Message.make_dedup_key(sender_phone or "", round(timestamp.timestamp() * 1000), body)
+        if key in seen:
+            continue # Leave duplicates from earlier repeated loads without a key
+        seen.add(key)
+        updates.append({"id": message_id, "key": key})
+
+    if updates:
+        db.session.execute(text("UPDATE messages SET dedup_key = :key WHERE message_id = :id"), updates)
+    db.session.commit()
+
+def add_checkpoint_completed_at():
+    """Add import_checkpoints.completed_at; imports recorded before it count as finished"""
+    if "completed_at" in table_columns("import_checkpoints"):
+        return
+
+    print("Upgrading schema: adding import_checkpoints.completed_at...")
+    db.session.execute(text("ALTER TABLE import_checkpoints ADD COLUMN completed_at TIMESTAMP"))
+    db.session.execute(text("UPDATE import_checkpoints SET completed_at = updated_at"))
+    db.session.commit()
+
+COMPACT_TABLE = "messages_compact" # The new messages table while the old one is copied into it
+SUFFIX_BATCH_SIZE = 5000
+
+def compact_messages():
+    """Convert a messages table that stores every field as text/float into the compact layout
+
+    Repeated strings move to the lookup tables, amounts become integer minor units and
+    shared body suffixes are stored once. Message ids are kept.
+    """
+    if "category" not in message_columns():
+        return # Already compact
+
+    print("Upgrading schema: converting messages to compact storage...")
+    drop_search_index() # Its view and triggers refer to the old columns
+    # An interrupted earlier run may have left the new table behind; dropping it drops its indexes too
+    db.session.execute(text(f"DROP TABLE IF EXISTS {COMPACT_TABLE}"))
+    # Index names are global, and the new table declares the same ones
+    for name in message_index_names():
+        db.session.execute(text(f"DROP INDEX {name}"))
+    db.session.commit()
+
+    compact = Message.__table__.to_metadata(MetaData(), name=COMPACT_TABLE)
+    for foreign_table in ("senders", "recipients", "body_suffixes", *(model.__tablename__ for _, model, _ in LOOKUPS)):
+        db.metadata.tables[foreign_table].to_metadata(compact.metadata) # So the foreign keys resolve
+    compact.create(db.engine)
+
+    for field, model, _ in LOOKUPS:
+        lookup = model.__tablename__
+        db.session.execute(text(
+            f"INSERT INTO {lookup} (name) SELECT DISTINCT {field} FROM messages "
+            f"WHERE {field} IS NOT NULL AND {field} NOT IN (SELECT name FROM {lookup})"
+        ))
+    keys = ", ".join(
+        f"(SELECT {key_column} FROM {model.__tablename__} WHERE name = messages.{field})"
+        for field, model, key_column in LOOKUPS
+    )
+    amounts = ", ".join(
+        f"CAST(ROUND({field} * {MINOR_UNITS}) AS BIGINT)" for field in ("transaction_amount", "new_balance", "fee")
+    )
+    db.session.execute(text(
+        f"INSERT INTO {COMPACT_TABLE} (message_id, sender_id, recipient_id, timestamp, body_text, transaction_id, dedup_key, "
+        f"{', '.join(key_column for _, _, key_column in LOOKUPS)}, amount_minor, balance_minor, fee_minor) "
+        f"SELECT message_id, sender_id, recipient_id, timestamp, message_body, transaction_id, dedup_key, {keys}, {amounts} "
+        f"FROM messages"
+    ))
+    db.session.execute(text("DROP TABLE messages"))
+    db.session.execute(text(f"ALTER TABLE {COMPACT_TABLE} RENAME TO messages"))
+    if db.engine.dialect.name == "postgresql":
+        # The ids were copied explicitly, so move the id sequence past them
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('messages', 'message_id'), coalesce(max(message_id), 1)) FROM messages"
+        ))
+    DataVersion.bump() # Every message was rewritten, so drop cached responses and ETags
+    db.session.commit()
+
+    compact_message_bodies()
+    if db.engine.dialect.name == "sqlite":
+        print("Upgrading schema: reclaiming free space...")
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+
+def compact_message_bodies():
+    """Store the body suffixes that more than one message shares once, in body_suffixes"""
+    messages = Message.__table__
+    suffix_counts = {}
+    for body, in db.session.query(messages.c.body_text).filter(messages.c.body_suffix_id.is_(None)).yield_per(SUFFIX_BATCH_SIZE):
+        _, suffix = split_body(body)
+        if suffix:
+            suffix_counts[suffix] = suffix_counts.get(suffix, 0) + 1
+    shared = [suffix for suffix, count in suffix_counts.items() if count > 1]
+    if not shared:
+        return
+    db.session.execute(BodySuffix.__table__.insert(), [{"text": suffix} for suffix in shared])
+    suffix_ids = dict(db.session.query(BodySuffix.text, BodySuffix.suffix_id).all())
+
+    # Walk the table by id, so the updates never disturb an open cursor
+    last_id = 0
+    while True:
+        rows = db.session.query(messages.c.message_id, messages.c.body_text) \
+                         .filter(messages.c.message_id > last_id, messages.c.body_suffix_id.is_(None)) \
+                         .order_by(messages.c.message_id).limit(SUFFIX_BATCH_SIZE).all()
+        if not rows:
+            break
+        last_id = rows[-1].message_id
+        updates = []
+        for message_id, body in rows:
+            body_text, suffix = split_body(body)
+            if suffix in suffix_ids:
+                updates.append({"id": message_id, "text": body_text, "suffix": suffix_ids[suffix]})
+        if updates:
+            db.session.execute(text("UPDATE messages SET body_text = :text, body_suffix_id = :suffix WHERE message_id = :id"), updates)
+    db.session.commit()
+
+def message_index_names():
+    """Return the names of the indexes on the messages table (other than its primary key)"""
+    if db.engine.dialect.name == "sqlite":
+        with db.engine.connect() as connection:
+            return [name for name, in connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages' AND sql IS NOT NULL"
+            ))]
+    return [index["name"] for index in inspect(db.engine).get_indexes("messages")]
+
+def existing_index_names():
+    """Return the names of all indexes in the database"""
+    if db.engine.dialect.name == "sqlite":
+        # Reflection skips expression indexes on SQLite, so read the catalog directly
+        with db.engine.connect() as connection:
+            return {name for name, in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    inspector = inspect(db.engine)
+    return {index["name"] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+
+# Indexes that served analytics queries on messages before they moved to DailyRollup;
+# dropping them speeds up ingest
+OBSOLETE_INDEXES = [
+    "ix_messages_day_amount",
+    "ix_messages_amount",
+    "ix_messages_recipient_amount",
+    "ix_messages_category_recipient_amount",
+]
+
+def drop_obsolete_indexes():
+    """Drop indexes that older versions created and nothing queries any more"""
+    existing = existing_index_names()
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            print(f"Upgrading schema: dropping index {name}...")
+            db.session.execute(text(f"DROP INDEX {name}"))
+    db.session.commit()
+
+def create_missing_indexes():
+    """Create indexes declared on the models that an existing database doesn't have yet"""
+    existing = existing_index_names()
+    for model_table in db.metadata.sorted_tables:
+        for index in model_table.indexes:
+            if index.name not in existing:
+                print(f"Upgrading schema: creating index {index.name}...")
+                index.create(db.engine)
+
+def backfill_rollups():
+    """Build the daily rollups for messages stored before the rollup table existed"""
+    if db.session.query(DailyRollup.rollup_id).first() is None and db.session.query(Message.message_id).first() is not None:
+        print("Upgrading schema: building daily rollups...")
+        rebuild_rollups()
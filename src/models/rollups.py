@@ -0,0 +1,69 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db # Import the shared db instance
+from src.models.sms import Message, DailyRollup, DataVersion
+
+COUNTERS = ("message_count", "transaction_count", "amount_total", "fee_total")
+
+def rollup_deltas(rows):
+    """Aggregate message rows (dicts with Message column names) into per-rollup-key deltas"""
+    deltas = {}
+    for row in rows:
+        key = (row["timestamp"].date(), row["category"] or "", row["recipient_name"] or "")
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = {"day": key[0], "category": key[1], "counterparty": key[2],
+                                   "message_count": 0, "transaction_count": 0, "amount_total": 0.0, "fee_total": 0.0}
+        delta["message_count"] += 1
+        if row["transaction_amount"] is not None:
+            delta["transaction_count"] += 1
+            delta["amount_total"] += row["transaction_amount"]
+        if row["fee"] is not None:
+            delta["fee_total"] += row["fee"]
+    return list(deltas.values())
+
+def update_rollups(rows):
+    """Add newly inserted messages to the rollups, inside the caller's transaction"""
+    deltas = rollup_deltas(rows)
+    if not deltas:
+        return
+    table = DailyRollup.__table__
+    dialect = db.engine.dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+        statement = insert.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.category, table.c.counterparty],
+            set_={counter: table.c[counter] + insert.excluded[counter] for counter in COUNTERS},
+        )
+        db.session.execute(statement, deltas)
+        return
+
+    # Other backends: update existing rows, insert the rest
+    for delta in deltas:
+        result = db.session.execute(
+            table.update()
+            .where(table.c.day == delta["day"], table.c.category == delta["category"], table.c.counterparty == delta["counterparty"])
+            .values({counter: table.c[counter] + delta[counter] for counter in COUNTERS})
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(delta))
+
+def rebuild_rollups():
+    """Recompute every rollup row from the messages table"""
+    day = func.date(Message.timestamp)
+    category = func.coalesce(Message.category, "")
+    counterparty = func.coalesce(Message.recipient_name, "")
+    source = db.session.query(
+        day, category, counterparty,
+        func.count(Message.message_id),
+        func.count(Message.transaction_amount),
+        func.coalesce(func.sum(Message.transaction_amount), 0.0),
+        func.coalesce(func.sum(Message.fee), 0.0),
+    ).group_by(day, category, counterparty)
+
+    table = DailyRollup.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(["day", "category", "counterparty", *COUNTERS], source))
+    DataVersion.bump() # Cached analytics responses and their ETags were built from the old rollups
+    db.session.commit()
@@ -0,0 +1,101 @@
+import re
+from sqlalchemy import column, table, text
+from sqlalchemy.exc import OperationalError
+from src.models.user import db # Import the shared db instance
+
+# Full-text index over the message body and recipient name (SQLite FTS5). It is an
+# external-content table: the text lives only in `messages` and its lookup tables, read
+# through the message_texts view, and the triggers below keep the index in sync with
+# every insert, update and delete.
+SEARCH_TABLE = "messages_fts"
+SEARCH_VIEW = "message_texts"
+message_search = table(SEARCH_TABLE, column("rowid"), column("rank"), column(SEARCH_TABLE))
+
+# Indexed values of the row a trigger removes; the view already shows the new state, so rebuild them from old.*
+OLD_TEXTS = """old.message_id,
+        old.body_text || coalesce((SELECT text FROM body_suffixes WHERE suffix_id = old.body_suffix_id), ''),
+        (SELECT name FROM counterparties WHERE counterparty_id = old.counterparty_id)"""
+
+SEARCH_DDL = [
+    f"""CREATE VIEW IF NOT EXISTS {SEARCH_VIEW} AS
+        SELECT messages.message_id AS message_id,
+               messages.body_text || coalesce(body_suffixes.text, '') AS message_body,
+               counterparties.name AS recipient_name
+        FROM messages
+        LEFT JOIN body_suffixes ON body_suffixes.suffix_id = messages.body_suffix_id
+        LEFT JOIN counterparties ON counterparties.counterparty_id = messages.counterparty_id""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        message_body, recipient_name, content='{SEARCH_VIEW}', content_rowid='message_id'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, message_body, recipient_name)
+        SELECT message_id, message_body, recipient_name FROM {SEARCH_VIEW} WHERE message_id = new.message_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, message_body, recipient_name)
+        VALUES ('delete', {OLD_TEXTS});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE ON messages BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, message_body, recipient_name)
+        VALUES ('delete', {OLD_TEXTS});
+        INSERT INTO {SEARCH_TABLE}(rowid, message_body, recipient_name)
+        SELECT message_id, message_body, recipient_name FROM {SEARCH_VIEW} WHERE message_id = new.message_id;
+    END""",
+]
+
+# Dropped in this order before the messages table is rebuilt
+SEARCH_OBJECTS = [
+    ("TRIGGER", "messages_fts_insert"),
+    ("TRIGGER", "messages_fts_delete"),
+    ("TRIGGER", "messages_fts_update"),
+    ("TABLE", SEARCH_TABLE),
+    ("VIEW", SEARCH_VIEW),
+]
+
+_available = {} # Database URL -> whether the search index exists there
+
+def create_search_index():
+    """Create the full-text index and its triggers, filling it from existing messages"""
+    if db.engine.dialect.name != "sqlite":
+        return False # Other backends use the LIKE fallback
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+    ).first() is not None
+    try:
+        for statement in SEARCH_DDL:
+            db.session.execute(text(statement))
+        if not exists:
+            print("Building full-text search index...")
+            db.session.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+        db.session.commit()
+    except OperationalError as e:
+        # SQLite builds without FTS5 keep working with the LIKE fallback
+        print(f"Full-text search unavailable: {e}")
+        db.session.rollback()
+        return False
+    _available.pop(str(db.engine.url), None)
+    return True
+
+def drop_search_index():
+    """Drop the full-text index, its triggers and view; create_search_index() rebuilds them"""
+    if db.engine.dialect.name != "sqlite":
+        return
+    for kind, name in SEARCH_OBJECTS:
+        db.session.execute(text(f"DROP {kind} IF EXISTS {name}"))
+    db.session.commit()
+    _available.pop(str(db.engine.url), None)
+
+def search_index_available():
+    """Return True when the current database has the full-text index"""
+    key = str(db.engine.url)
+    if key not in _available:
+        _available[key] = db.engine.dialect.name == "sqlite" and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+        ).first() is not None
+    return _available[key]
+
+def to_match_query(search_term):
+    """Turn free text from the search box into an FTS5 query of prefix-matched words"""
+    words = re.findall(r"\w+", search_term)
+    # Every word must match; each is quoted so it can't be read as FTS5 syntax
+    return " ".join(f'"{word}"*' for word in words)
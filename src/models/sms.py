@@ -1,5 +1,9 @@
 from src.models.user import db # Import the shared db instance
 from datetime import datetime # To handle date and time objects
+import hashlib # To fingerprint messages for deduplication
+import re # To find the shared boilerplate at the end of message bodies
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.orm import column_property
 
 class Sender(db.Model):
     __tablename__ = "senders"
@@ -15,25 +19,91 @@ class Recipient(db.Model):
     name = db.Column(db.String(100))
     messages_received = db.relationship("Message", foreign_keys="Message.recipient_id", back_populates="recipient")
 
+# --- Lookup tables ---
+# Strings that repeat across many messages are stored once each; messages refer to them by
+# a small integer key, which keeps rows and the indexes on them compact
+class Category(db.Model):
+    __tablename__ = "categories"
+    category_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+class Currency(db.Model):
+    __tablename__ = "currencies"
+    currency_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(10), unique=True, nullable=False)
+
+class Status(db.Model):
+    __tablename__ = "statuses"
+    status_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(20), unique=True, nullable=False)
+
+class Counterparty(db.Model):
+    __tablename__ = "counterparties"
+    counterparty_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+class BodySuffix(db.Model):
+    """Boilerplate that many message bodies end with, such as the "Kanda*182*16#..." promotions"""
+    __tablename__ = "body_suffixes"
+    suffix_id = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.Text, unique=True, nullable=False)
+
+# Message fields kept in lookup tables: (field name, lookup model, key column on messages)
+LOOKUPS = [
+    ("category", Category, "category_id"),
+    ("currency", Currency, "currency_id"),
+    ("status", Status, "status_id"),
+    ("recipient_name", Counterparty, "counterparty_id"),
+]
+
+MINOR_UNITS = 100 # Amounts are stored as integer hundredths of the currency unit
+
+def to_minor(amount):
+    """Convert an amount to integer minor units (None stays None)"""
+    return None if amount is None else round(amount * MINOR_UNITS)
+
+# The per-message details of a body: date-times, amounts and long numbers (ids, phones).
+# Whatever follows the last of them is the same for every message of that kind. The leading
+# greedy .* makes a single search backtrack from the end of the body to that last detail.
+LAST_BODY_DETAIL_RE = re.compile(r".*(?:\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}|\d\s*RWF|\d{5})", re.IGNORECASE | re.DOTALL)
+MIN_SUFFIX_LENGTH = 32 # Shorter tails aren't worth a lookup
+
+def split_body(body):
+    """Split a body into (text, suffix) where suffix is the fixed text after its last detail, or \"\" """
+    match = LAST_BODY_DETAIL_RE.match(body)
+    end = match.end() if match else 0
+    if len(body) - end < MIN_SUFFIX_LENGTH:
+        return body, ""
+    return body[:end], body[end:]
+
 class Message(db.Model):
     __tablename__ = "messages"
     message_id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey("senders.sender_id"))
     recipient_id = db.Column(db.Integer, db.ForeignKey("recipients.recipient_id"))
     timestamp = db.Column(db.DateTime, nullable=False)
-    message_body = db.Column(db.Text, nullable=False)
-    category = db.Column(db.String(50))
-    transaction_amount = db.Column(db.Float)
-    currency = db.Column(db.String(10))
-    status = db.Column(db.String(20))
-    new_balance = db.Column(db.Float)
-    fee = db.Column(db.Float)
+    # The body is body_text followed by the text of body_suffix_id, if any (see split_body)
+    body_text = db.Column(db.Text, nullable=False)
+    body_suffix_id = db.Column(db.Integer, db.ForeignKey("body_suffixes.suffix_id"))
+    category_id = db.Column(db.SmallInteger, db.ForeignKey("categories.category_id"))
+    amount_minor = db.Column(db.BigInteger) # Amounts in MINOR_UNITS
+    currency_id = db.Column(db.SmallInteger, db.ForeignKey("currencies.currency_id"))
+    status_id = db.Column(db.SmallInteger, db.ForeignKey("statuses.status_id"))
+    balance_minor = db.Column(db.BigInteger)
+    fee_minor = db.Column(db.BigInteger)
     transaction_id = db.Column(db.String(50))
-    recipient_name = db.Column(db.String(100))
+    counterparty_id = db.Column(db.Integer, db.ForeignKey("counterparties.counterparty_id"))
+    # SHA-1 of (sender phone, date in ms, body); lets re-imports skip messages already stored
+    dedup_key = db.Column(db.String(40), unique=True, index=True)
 
     sender = db.relationship("Sender", foreign_keys=[sender_id], back_populates="messages_sent")
     recipient = db.relationship("Recipient", foreign_keys=[recipient_id], back_populates="messages_received")
 
+    @staticmethod
+    def make_dedup_key(sender_phone, date_ms, message_body):
+        """Build the key that identifies one SMS across imports"""
+        return hashlib.sha1(f"{sender_phone}\x1f{date_ms}\x1f{message_body}".encode("utf-8")).hexdigest()
+
     def to_dict(self):
         return {
             "message_id": self.message_id,
@@ -49,4 +119,90 @@ class Message(db.Model):
             "fee": self.fee,
             "transaction_id": self.transaction_id,
             "recipient_name": self.recipient_name
-        }
\ No newline at end of file
+        }
+
+# --- Decoded fields ---
+# Read-only attributes that give the compact columns back under their original names and
+# types, both on loaded messages and in queries (filters, exports, rollup rebuilds)
+def decoded_lookup(model, key_column):
+    """The lookup value a message refers to, as a correlated subquery on its primary key"""
+    return column_property(
+        select(model.name).where(getattr(model, key_column) == getattr(Message, key_column)).scalar_subquery()
+    )
+
+def decoded_amount(column):
+    """An integer minor-unit column converted back to a float amount"""
+    return column_property(cast(column, Float) / MINOR_UNITS)
+
+Message.category = decoded_lookup(Category, "category_id")
+Message.currency = decoded_lookup(Currency, "currency_id")
+Message.status = decoded_lookup(Status, "status_id")
+Message.recipient_name = decoded_lookup(Counterparty, "counterparty_id")
+Message.message_body = column_property(Message.body_text + func.coalesce(
+    select(BodySuffix.text).where(BodySuffix.suffix_id == Message.body_suffix_id).scalar_subquery(), ""
+))
+Message.transaction_amount = decoded_amount(Message.amount_minor)
+Message.new_balance = decoded_amount(Message.balance_minor)
+Message.fee = decoded_amount(Message.fee_minor)
+
+# --- Indexes ---
+# Chosen for the /messages queries in routes/sms.py, so that filtering and ordering messages
+# reads an index instead of scanning the whole table (the analytics endpoints read DailyRollup)
+db.Index("ix_messages_timestamp", Message.timestamp) # Date range filters and newest-first ordering
+db.Index("ix_messages_category_timestamp", Message.category_id, Message.timestamp) # Category filter + ordering
+
+class ImportCheckpoint(db.Model):
+    __tablename__ = "import_checkpoints"
+    checkpoint_id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(255), unique=True, nullable=False) # Name of the imported backup file
+    last_date_ms = db.Column(db.BigInteger, nullable=False, default=0) # Newest <sms> date committed so far
+    messages_imported = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime) # When the whole file was last imported; None while an import is unfinished
+
+class DailyRollup(db.Model):
+    """Per-day message counts and totals, maintained by the ingest path for the analytics endpoints"""
+    __tablename__ = "daily_rollups"
+    rollup_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    category = db.Column(db.String(50), nullable=False, default="") # "" when the message had no category
+    counterparty = db.Column(db.String(100), nullable=False, default="") # Message.recipient_name, "" when missing
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0) # Messages with a transaction_amount
+    amount_total = db.Column(db.Float, nullable=False, default=0.0)
+    fee_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint("day", "category", "counterparty", name="uq_daily_rollups_key"),
+        db.Index("ix_daily_rollups_counterparty", "counterparty", "category"),
+    )
+
+class DataVersion(db.Model):
+    """Single-row counter bumped by every import that changes the data; used to invalidate caches"""
+    __tablename__ = "data_version"
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls):
+        """Return (version, updated_at) for the data as it is now"""
+        row = db.session.query(cls.version, cls.updated_at).filter(cls.id == 1).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    @classmethod
+    def bump(cls):
+        """Increment the version inside the caller's transaction"""
+        table = cls.__table__
+        result = db.session.execute(
+            table.update().where(table.c.id == 1).values(version=table.c.version + 1, updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(id=1, version=1, updated_at=datetime.utcnow()))
+
+class SchemaVersion(db.Model):
+    """Single-row record of the schema version the database was last upgraded to"""
+    __tablename__ = "schema_version"
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    upgraded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,35 @@
+from flask import Blueprint, current_app, jsonify, request, url_for
+from src.imports import import_jobs
+
+imports_bp = Blueprint("imports", __name__)
+
+@imports_bp.route("/imports", methods=["POST"])
+def create_import():
+    """API endpoint to upload an SMS backup (multipart field "file") and import it in the background
+
+    Answers 202 right away with the job; poll GET /imports/<id> for its progress.
+    """
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "Upload an XML backup in the 'file' field."}), 400
+    if not upload.filename.lower().endswith(".xml"):
+        return jsonify({"error": "Only XML backups can be imported."}), 400
+
+    job = import_jobs.submit(current_app._get_current_object(), upload)
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers["Location"] = url_for("imports.get_import", job_id=job.id)
+    return response
+
+@imports_bp.route("/imports", methods=["GET"])
+def list_imports():
+    """API endpoint listing the import jobs of this process, newest first"""
+    return jsonify([job.to_dict() for job in reversed(import_jobs.list())])
+
+@imports_bp.route("/imports/<job_id>", methods=["GET"])
+def get_import(job_id):
+    """API endpoint for the status, progress and counts of one import job"""
+    job = import_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(job.to_dict())
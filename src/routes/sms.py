@@ -1,52 +1,93 @@
-from flask import Blueprint, jsonify, request
+import base64
+import csv
+import heapq
+import io
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from src.models.user import db # Import the shared db instance
-from src.models.sms import Message, Sender, Recipient # Import our SMS models
-from sqlalchemy import func, desc # For database functions like count, sum, and ordering
-from datetime import datetime
+from src.models.sms import Message, Sender, Recipient, Category, DailyRollup # Import our SMS models
+from src.models.search import message_search, search_index_available, to_match_query
+from src.cache import cached_response, response_cache
+from src.analytics import BUCKETS, FIELDS, GROUPINGS, METRICS, analytics_available, column_store
+from sqlalchemy import func, desc, and_, or_, case, select # For database functions like count, sum, and ordering
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 
 # Create a Blueprint for SMS routes
 sms_bp = Blueprint("sms_bp", __name__)
 
 # --- API Endpoints will be defined below --- #
 
-@sms_bp.route("/messages", methods=["GET"])
-def get_messages():
-    """API endpoint to get all messages with optional filtering"""
-    # We will implement filtering and pagination later
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 10, type=int)
-    start_date_str = request.args.get("start_date")
-    end_date_str = request.args.get("end_date")
-    category = request.args.get("category")
-    search_term = request.args.get("search")
+def filter_messages(query, args):
+    """Apply the start_date, end_date, category and search filters shared by the message endpoints
 
-    query = Message.query
+    Returns the filtered query and whether it can be ranked by relevance; raises ValueError
+    with a user-facing message for malformed arguments.
+    """
+    start_date_str = args.get("start_date")
+    end_date_str = args.get("end_date")
+    category = args.get("category")
+    search_term = args.get("search")
 
     if start_date_str:
         try:
             start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-            query = query.filter(Message.timestamp >= start_date)
         except ValueError:
-            return jsonify({"error": "Invalid start_date format. Use YYYY-MM-DD."}), 400
+            raise ValueError("Invalid start_date format. Use YYYY-MM-DD.")
+        query = query.filter(Message.timestamp >= start_date)
     
     if end_date_str:
         try:
             end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
-            # To include the entire end day, we can filter up to the end of that day
-            from datetime import timedelta
-            end_date = end_date + timedelta(days=1) - timedelta(seconds=1)
-            query = query.filter(Message.timestamp <= end_date)
         except ValueError:
-            return jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD."}), 400
+            raise ValueError("Invalid end_date format. Use YYYY-MM-DD.")
+        # To include the entire end day, we can filter up to the end of that day
+        end_date = end_date + timedelta(days=1) - timedelta(seconds=1)
+        query = query.filter(Message.timestamp <= end_date)
 
     if category and category.lower() != "all categories":
-        query = query.filter(Message.category == category)
+        # Compare the category key, so the (category_id, timestamp) index serves the filter
+        category_id = select(Category.category_id).where(Category.name == category).scalar_subquery()
+        query = query.filter(Message.category_id == category_id)
     
+    ranked = False
     if search_term:
-        query = query.filter(Message.message_body.ilike(f"%{search_term}%"))
+        query, ranked = apply_search(query, search_term)
+    return query, ranked
+
+MAX_PER_PAGE = 1000 # Largest page the message endpoints return; /messages/export streams any amount
+
+def page_size(args, default=10):
+    """Read per_page from the request arguments, clamped to 1..MAX_PER_PAGE"""
+    return max(1, min(args.get("per_page", default, type=int), MAX_PER_PAGE))
+
+@sms_bp.route("/messages", methods=["GET"])
+@cached_response
+def get_messages():
+    """API endpoint to get all messages with optional filtering"""
+    page = request.args.get("page", 1, type=int)
+    per_page = page_size(request.args)
+    sort = request.args.get("sort", "newest") # "relevance" ranks search results by match quality
+    after = request.args.get("after") # Cursor mode: pass an empty value for the first page, then next_cursor
+    include_total = request.args.get("include_total", "false").lower() in ("1", "true", "yes")
+
+    # Load sender and recipient in the same query, so to_dict() doesn't issue two queries per row
+    query = Message.query.options(joinedload(Message.sender), joinedload(Message.recipient))
+    try:
+        query, ranked = filter_messages(query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Order by timestamp in descending order (newest first)
-    query = query.order_by(desc(Message.timestamp))
+    if after is not None:
+        if ranked and sort == "relevance":
+            return jsonify({"error": "Cursor pagination only supports sort=newest."}), 400
+        return get_messages_after(query, after, per_page, include_total)
+
+    if ranked and sort == "relevance":
+        query = query.order_by(message_search.c.rank, desc(Message.timestamp))
+    else:
+        # Order by timestamp in descending order (newest first)
+        query = query.order_by(desc(Message.timestamp))
 
     paginated_messages = query.paginate(page=page, per_page=per_page, error_out=False)
     messages_data = [msg.to_dict() for msg in paginated_messages.items]
@@ -58,18 +99,148 @@ def get_messages():
         "current_page": paginated_messages.page
     })
 
+# Columns of Message.to_dict(), in order, for the export endpoint
+EXPORT_COLUMNS = [
+    ("message_id", Message.message_id),
+    ("sender_phone", Sender.phone_number),
+    ("recipient_phone", Recipient.phone_number),
+    ("timestamp", Message.timestamp),
+    ("message_body", Message.message_body),
+    ("category", Message.category),
+    ("transaction_amount", Message.transaction_amount),
+    ("currency", Message.currency),
+    ("status", Message.status),
+    ("new_balance", Message.new_balance),
+    ("fee", Message.fee),
+    ("transaction_id", Message.transaction_id),
+    ("recipient_name", Message.recipient_name),
+]
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "messages.ndjson"),
+    "csv": ("text/csv", "messages.csv"),
+}
+EXPORT_CHUNK_SIZE = 1000 # Rows fetched from the database cursor and sent per chunk
+
+@sms_bp.route("/messages/export", methods=["GET"])
+def export_messages():
+    """API endpoint to stream every message matching the /messages filters as NDJSON or CSV"""
+    export_format = request.args.get("format", "ndjson").lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Invalid format. Use ndjson or csv."}), 400
+
+    # Select only the exported columns, with the sender/recipient phones joined in
+    query = db.session.query(*(column for _, column in EXPORT_COLUMNS)) \
+                      .select_from(Message) \
+                      .outerjoin(Sender, Message.sender_id == Sender.sender_id) \
+                      .outerjoin(Recipient, Message.recipient_id == Recipient.recipient_id)
+    try:
+        query, _ = filter_messages(query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    statement = query.order_by(desc(Message.timestamp), desc(Message.message_id)).statement
+
+    mimetype, filename = EXPORT_FORMATS[export_format]
+    serialize = export_csv if export_format == "csv" else export_ndjson
+    response = Response(stream_with_context(serialize(stream_rows(statement))), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+def stream_rows(statement):
+    """Yield chunks of result rows from a server-side cursor, on a connection of its own"""
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        for rows in result.partitions(EXPORT_CHUNK_SIZE):
+            yield rows
+
+def export_row(row):
+    """Convert a result row to the same values Message.to_dict() returns"""
+    values = dict(zip((name for name, _ in EXPORT_COLUMNS), row))
+    values["timestamp"] = values["timestamp"].isoformat()
+    return values
+
+def export_ndjson(chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(export_row(row)) + "\n" for row in rows)
+
+def export_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue() # The header goes out before the query even runs
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow(export_row(row).values())
+        yield buffer.getvalue()
+
+def encode_cursor(message):
+    """Build the opaque cursor that points just past a message in newest-first order"""
+    position = json.dumps([message.timestamp.isoformat(), message.message_id])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """Return the (timestamp, message_id) a cursor points past"""
+    timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return datetime.fromisoformat(timestamp), int(message_id)
+
+def get_messages_after(query, after, per_page, include_total):
+    """Keyset pagination: return the page of messages that follows the cursor"""
+    if include_total:
+        # Optional, as counting the whole filtered set costs as much as reading it
+        total = query.order_by(None).count()
+
+    if after:
+        try:
+            timestamp, message_id = decode_cursor(after)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor."}), 400
+        # Seek straight to the cursor through the timestamp index instead of skipping rows with OFFSET
+        query = query.filter(Message.timestamp <= timestamp, or_(
+            Message.timestamp < timestamp,
+            and_(Message.timestamp == timestamp, Message.message_id < message_id),
+        ))
+
+    # message_id breaks ties between messages with the same timestamp
+    query = query.order_by(desc(Message.timestamp), desc(Message.message_id))
+    messages = query.limit(per_page + 1).all() # One extra row tells us whether another page exists
+    has_more = len(messages) > per_page
+    messages = messages[:per_page]
+
+    response = {
+        "messages": [msg.to_dict() for msg in messages],
+        "next_cursor": encode_cursor(messages[-1]) if has_more else None
+    }
+    if include_total:
+        response["total_messages"] = total
+    return jsonify(response)
+
+def apply_search(query, search_term):
+    """Filter a message query by search text; returns the query and whether it can be ranked"""
+    match_query = to_match_query(search_term)
+    if match_query and search_index_available():
+        # Full-text index: word-prefix matches on the message body and recipient name
+        query = query.join(message_search, message_search.c.rowid == Message.message_id) \
+                     .filter(message_search.c[message_search.name].match(match_query))
+        return query, True
+    # Fallback for databases without the index (and searches with no words in them)
+    return query.filter(Message.message_body.ilike(f"%{search_term}%")), False
+
+# The analytics endpoints below read the daily rollups (see models/rollups.py), which ingest
+# keeps up to date, so their cost depends on the number of days and counterparties rather
+# than on the number of stored messages.
+
 @sms_bp.route("/statistics", methods=["GET"])
+@cached_response
 def get_statistics():
     """API endpoint to get overall SMS statistics"""
-    total_messages = Message.query.count()
-    
-    # Calculate total transaction volume (sum of transaction_amount where it's not null)
-    total_volume_query = db.session.query(func.sum(Message.transaction_amount)).filter(Message.transaction_amount != None)
-    total_volume_result = total_volume_query.scalar() # scalar() returns the first element of the first result or None
-    total_volume = total_volume_result if total_volume_result is not None else 0.0
-
-    # Count only messages that represent a transaction (e.g., have a transaction_amount)
-    total_transactions = Message.query.filter(Message.transaction_amount != None).count()
+    total_messages, total_transactions, total_volume = db.session.query(
+        func.coalesce(func.sum(DailyRollup.message_count), 0),
+        # Count only messages that represent a transaction (e.g., have a transaction_amount)
+        func.coalesce(func.sum(DailyRollup.transaction_count), 0),
+        # Total transaction volume (sum of transaction_amount where it's not null)
+        func.coalesce(func.sum(DailyRollup.amount_total), 0.0)
+    ).one()
     
     avg_transaction = (total_volume / total_transactions) if total_transactions > 0 else 0
     
@@ -81,53 +252,52 @@ def get_statistics():
     })
 
 @sms_bp.route("/categories", methods=["GET"])
+@cached_response
 def get_categories():
     """API endpoint to get message counts per category"""
-    category_counts = db.session.query(Message.category, func.count(Message.category)).group_by(Message.category).all()
+    category_counts = db.session.query(DailyRollup.category, func.sum(DailyRollup.message_count)).group_by(DailyRollup.category).all()
     categories_data = {cat: count for cat, count in category_counts if cat}
     return jsonify(categories_data)
 
 @sms_bp.route("/trends/daily", methods=["GET"])
+@cached_response
 def get_daily_trends():
     """API endpoint to get daily transaction trends (count of messages per day)"""
-    # This query groups messages by date and counts them
-    # Note: SQLite date functions might require specific handling for date extraction
-    # For simplicity, we assume timestamp is stored as DateTime and can be truncated or grouped
-    
-    # Using func.date for SQLite to extract date part from datetime
-    daily_counts = db.session.query(func.date(Message.timestamp).label("date"), func.count(Message.message_id).label("count")) \
-                               .group_by(func.date(Message.timestamp)) \
-                               .order_by(func.date(Message.timestamp)) \
+    daily_counts = db.session.query(DailyRollup.day, func.sum(DailyRollup.message_count).label("count")) \
+                               .group_by(DailyRollup.day) \
+                               .order_by(DailyRollup.day) \
                                .all()
     
     trends_data = {str(date_obj): count for date_obj, count in daily_counts}
     return jsonify(trends_data)
 
 @sms_bp.route("/trends/volume/daily", methods=["GET"])
+@cached_response
 def get_daily_volume_trends():
     """API endpoint to get daily transaction volume trends"""
     daily_volume = db.session.query(
-                            func.date(Message.timestamp).label("date"), 
-                            func.sum(Message.transaction_amount).label("total_volume")
+                            DailyRollup.day, 
+                            func.sum(DailyRollup.amount_total).label("total_volume")
                         ) \
-                        .filter(Message.transaction_amount != None) \
-                        .group_by(func.date(Message.timestamp)) \
-                        .order_by(func.date(Message.timestamp)) \
+                        .filter(DailyRollup.transaction_count > 0) \
+                        .group_by(DailyRollup.day) \
+                        .order_by(DailyRollup.day) \
                         .all()
     
     volume_data = {str(date_obj): (volume if volume is not None else 0) for date_obj, volume in daily_volume}
     return jsonify(volume_data)
 
 @sms_bp.route("/top/recipients", methods=["GET"])
+@cached_response
 def get_top_recipients():
     """API endpoint to get top recipients by transaction volume"""
-    # This query groups by recipient_name and sums transaction_amount
+    # This query groups by recipient name (the rollup counterparty) and sums transaction amounts
     top_recipients_query = db.session.query(
-                                Message.recipient_name, 
-                                func.sum(Message.transaction_amount).label("total_spent")
+                                DailyRollup.counterparty, 
+                                func.sum(DailyRollup.amount_total).label("total_spent")
                             ) \
-                            .filter(Message.recipient_name != None, Message.transaction_amount != None) \
-                            .group_by(Message.recipient_name) \
+                            .filter(DailyRollup.counterparty != "", DailyRollup.transaction_count > 0) \
+                            .group_by(DailyRollup.counterparty) \
                             .order_by(desc("total_spent")) \
                             .limit(5) # Get top 5
     
@@ -135,21 +305,134 @@ def get_top_recipients():
     return jsonify(top_recipients_data)
 
 @sms_bp.route("/top/senders", methods=["GET"])
+@cached_response
 def get_top_senders():
     """API endpoint to get top senders by transaction volume (for incoming money)"""
-    # This query groups by sender's name (if available, otherwise phone) and sums transaction_amount for 'Incoming Money'
-    # For simplicity, we'll assume recipient_name in Message can also be used for sender name in 'Incoming Money' context
-    # or we can join with Sender table if sender names are populated there.
-    # Here, we'll use recipient_name from the message body if it was extracted as the sender for incoming transactions.
-    
+    # For 'Incoming Money', the name extracted into recipient_name (the rollup counterparty)
+    # is the person who sent the money
     top_senders_query = db.session.query(
-                                Message.recipient_name, # Assuming this field stores the sender's name for incoming money
-                                func.sum(Message.transaction_amount).label("total_received")
+                                DailyRollup.counterparty,
+                                func.sum(DailyRollup.amount_total).label("total_received")
                             ) \
-                            .filter(Message.category == "Incoming Money", Message.recipient_name != None, Message.transaction_amount != None) \
-                            .group_by(Message.recipient_name) \
+                            .filter(DailyRollup.category == "Incoming Money", DailyRollup.counterparty != "", DailyRollup.transaction_count > 0) \
+                            .group_by(DailyRollup.counterparty) \
                             .order_by(desc("total_received")) \
                             .limit(5) # Get top 5
 
     top_senders_data = {name: (amount if amount is not None else 0) for name, amount in top_senders_query.all()}
-    return jsonify(top_senders_data)
\ No newline at end of file
+    return jsonify(top_senders_data)
+
+@sms_bp.route("/dashboard", methods=["GET"])
+@cached_response
+def get_dashboard():
+    """API endpoint that returns every dashboard panel in one payload
+
+    Equivalent to calling /statistics, /messages, /categories, /trends/daily,
+    /trends/volume/daily, /top/recipients and /top/senders, but built from three queries.
+    """
+    per_page = page_size(request.args)
+
+    # Pass 1: one grouped read of the rollups gives statistics, categories and both trends
+    rows = db.session.query(
+        DailyRollup.day,
+        DailyRollup.category,
+        func.sum(DailyRollup.message_count),
+        func.sum(DailyRollup.transaction_count),
+        func.sum(DailyRollup.amount_total)
+    ).group_by(DailyRollup.day, DailyRollup.category).order_by(DailyRollup.day).all()
+
+    total_messages = total_transactions = 0
+    total_volume = 0.0
+    categories = {}
+    daily_counts = {}
+    daily_volume = {}
+    for day, category, message_count, transaction_count, amount_total in rows:
+        day = str(day)
+        total_messages += message_count
+        total_transactions += transaction_count
+        total_volume += amount_total
+        if category:
+            categories[category] = categories.get(category, 0) + message_count
+        daily_counts[day] = daily_counts.get(day, 0) + message_count
+        if transaction_count > 0:
+            daily_volume[day] = daily_volume.get(day, 0) + amount_total
+
+    # Pass 2: totals per counterparty, overall and for incoming money, for both top-5 lists
+    incoming = DailyRollup.category == "Incoming Money"
+    counterparties = db.session.query(
+        DailyRollup.counterparty,
+        func.sum(DailyRollup.amount_total),
+        func.sum(DailyRollup.transaction_count),
+        func.sum(case((incoming, DailyRollup.amount_total), else_=0)),
+        func.sum(case((incoming, DailyRollup.transaction_count), else_=0))
+    ).filter(DailyRollup.counterparty != "").group_by(DailyRollup.counterparty).all()
+
+    top_recipients = heapq.nlargest(5, ((amount, name) for name, amount, count, _, _ in counterparties if count > 0))
+    top_senders = heapq.nlargest(5, ((amount, name) for name, _, _, amount, count in counterparties if count > 0))
+
+    # Pass 3: the newest page of messages, with senders and recipients joined in
+    messages = Message.query.options(joinedload(Message.sender), joinedload(Message.recipient)) \
+                            .order_by(desc(Message.timestamp), desc(Message.message_id)) \
+                            .limit(per_page + 1) \
+                            .all()
+
+    return jsonify({
+        "statistics": {
+            "total_messages": total_messages,
+            "total_transactions": total_transactions,
+            "total_volume": total_volume,
+            "avg_transaction": (total_volume / total_transactions) if total_transactions > 0 else 0
+        },
+        "messages": [msg.to_dict() for msg in messages[:per_page]],
+        "next_cursor": encode_cursor(messages[per_page - 1]) if len(messages) > per_page else None,
+        "categories": categories,
+        "trends": daily_counts,
+        "volume": daily_volume,
+        "top_recipients": {name: amount for amount, name in top_recipients},
+        "top_senders": {name: amount for amount, name in top_senders}
+    })
+
+@sms_bp.route("/analytics", methods=["GET"])
+@cached_response
+def get_analytics():
+    """API endpoint for ad-hoc time-bucketed aggregations, answered by the in-memory column store
+
+    Query arguments: bucket (hour/day/week/month), metric (count/sum/mean/min/max/percentile/balance),
+    field (amount/fee), q (percentile, 0-100), group_by (none/category/counterparty),
+    category, start_date and end_date (YYYY-MM-DD).
+    """
+    if not analytics_available():
+        return jsonify({"error": "The analytics engine requires NumPy."}), 503
+
+    bucket = request.args.get("bucket", "day")
+    metric = request.args.get("metric", "count")
+    field = request.args.get("field", "amount")
+    group_by = request.args.get("group_by", "none")
+    for name, value, allowed in [("bucket", bucket, BUCKETS), ("metric", metric, METRICS), ("field", field, FIELDS), ("group_by", group_by, GROUPINGS)]:
+        if value not in allowed:
+            return jsonify({"error": f"Invalid {name}. Use one of: {', '.join(allowed)}."}), 400
+    try:
+        percentile = float(request.args.get("q", 50.0))
+    except ValueError:
+        percentile = None # Rejected below, like q=nan
+    if percentile is None or not 0 <= percentile <= 100:
+        return jsonify({"error": "Invalid q. Use a percentile between 0 and 100."}), 400
+
+    try:
+        start = datetime.strptime(request.args["start_date"], "%Y-%m-%d") if request.args.get("start_date") else None
+        end = datetime.strptime(request.args["end_date"], "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1) if request.args.get("end_date") else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    category = request.args.get("category")
+    if category and category.lower() == "all categories":
+        category = None
+
+    column_store.refresh()
+    series = column_store.aggregate(bucket=bucket, metric=metric, field=field, group_by=group_by,
+                                    category=category, start=start, end=end, percentile=percentile)
+    return jsonify({"bucket": bucket, "metric": metric, "field": field, "group_by": group_by, "series": series})
+
+@sms_bp.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """API endpoint to get response cache hit/miss counters for this process"""
+    return jsonify(response_cache.stats())
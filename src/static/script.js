@@ -15,13 +15,8 @@ const currentConfig = isDevelopment ? API_CONFIG.development : API_CONFIG.produc
 // API endpoints
 const API_BASE_URL = currentConfig.baseUrl;
 const ENDPOINTS = {
-    messages: `${API_BASE_URL}/messages`,
-    statistics: `${API_BASE_URL}/statistics`,
-    categories: `${API_BASE_URL}/categories`,
-    trends: `${API_BASE_URL}/trends/daily`,
-    volume: `${API_BASE_URL}/trends/volume/daily`,
-    topRecipients: `${API_BASE_URL}/top/recipients`,
-    topSenders: `${API_BASE_URL}/top/senders`
+    dashboard: `${API_BASE_URL}/dashboard`,
+    messages: `${API_BASE_URL}/messages`
 };
 
 // Chart instances
@@ -32,84 +27,37 @@ let volumeChart = null;
 // Initialize the dashboard
 document.addEventListener('DOMContentLoaded', async () => {
     try {
-        // Load initial data
-        await Promise.all([
-            loadStatistics(),
-            loadMessages(),
-            loadCharts(),
-            loadTopEntities()
-        ]);
-
-        // Set up event listeners
-        setupEventListeners();
+        // Load initial data (every panel comes from a single request)
+        await loadDashboard();
     } catch (error) {
         console.error('Error initializing dashboard:', error);
         showError('Failed to load dashboard data. Please try refreshing the page.');
     }
-});
 
-// Load and display statistics
-async function loadStatistics() {
-    try {
-        const response = await fetch(ENDPOINTS.statistics);
-        const data = await response.json();
-        
-        // Update summary cards
-        document.getElementById('totalMessages').textContent = data.total_messages.toLocaleString();
-        document.getElementById('totalTransactions').textContent = data.total_transactions.toLocaleString();
-        document.getElementById('totalVolume').textContent = `${data.total_volume.toLocaleString()} RWF`;
-        document.getElementById('avgTransaction').textContent = `${data.avg_transaction.toLocaleString()} RWF`;
-    } catch (error) {
-        console.error('Error loading statistics:', error);
-    }
-}
+    // Set up event listeners even if the first load failed, so filters and search still work
+    setupEventListeners();
+});
 
-// Load and display messages
-async function loadMessages() {
-    try {
-        const response = await fetch(ENDPOINTS.messages);
-        const data = await response.json();
-        
-        const tbody = document.getElementById('messagesTableBody');
-        tbody.innerHTML = '';
-        
-        data.messages.forEach(message => {
-            const row = document.createElement('tr');
-            row.innerHTML = `
-                <td>${new Date(message.timestamp).toLocaleString()}</td>
-                <td>${message.category}</td>
-                <td>${message.transaction_amount ? `${message.transaction_amount.toLocaleString()} ${message.currency}` : '-'}</td>
-                <td>${message.recipient_name || message.sender_phone}</td>
-                <td>${message.new_balance ? `${message.new_balance.toLocaleString()} ${message.currency}` : '-'}</td>
-                <td>${message.message_body.substring(0, 50)}...</td>
-            `;
-            tbody.appendChild(row);
-        });
-    } catch (error) {
-        console.error('Error loading messages:', error);
-    }
+// Load every dashboard panel in one request
+async function loadDashboard() {
+    const response = await fetch(ENDPOINTS.dashboard);
+    const data = await response.json();
+
+    displayStatistics(data.statistics);
+    updateMessagesTable(data.messages);
+    createCategoryChart(data.categories);
+    createTrendsChart(data.trends);
+    createVolumeChart(data.volume);
+    displayTopEntities(data.top_recipients, data.top_senders);
 }
 
-// Load and display charts
-async function loadCharts() {
-    try {
-        const [categoriesResponse, trendsResponse, volumeResponse] = await Promise.all([
-            fetch(ENDPOINTS.categories),
-            fetch(ENDPOINTS.trends),
-            fetch(ENDPOINTS.volume)
-        ]);
-
-        const categoriesData = await categoriesResponse.json();
-        const trendsData = await trendsResponse.json();
-        const volumeData = await volumeResponse.json();
-        
-        // Create charts
-        createCategoryChart(categoriesData);
-        createTrendsChart(trendsData);
-        createVolumeChart(volumeData);
-    } catch (error) {
-        console.error('Error loading charts:', error);
-    }
+// Display statistics
+function displayStatistics(data) {
+    // Update summary cards
+    document.getElementById('totalMessages').textContent = data.total_messages.toLocaleString();
+    document.getElementById('totalTransactions').textContent = data.total_transactions.toLocaleString();
+    document.getElementById('totalVolume').textContent = `${data.total_volume.toLocaleString()} RWF`;
+    document.getElementById('avgTransaction').textContent = `${data.avg_transaction.toLocaleString()} RWF`;
 }
 
 // Create category pie chart
@@ -190,39 +138,27 @@ function createVolumeChart(data) {
     });
 }
 
-// Load and display top entities
-async function loadTopEntities() {
-    try {
-        const [recipientsResponse, sendersResponse] = await Promise.all([
-            fetch(ENDPOINTS.topRecipients),
-            fetch(ENDPOINTS.topSenders)
-        ]);
-
-        const recipientsData = await recipientsResponse.json();
-        const sendersData = await sendersResponse.json();
-        
-        // Display top recipients
-        const topRecipientsDiv = document.getElementById('topRecipients');
-        topRecipientsDiv.innerHTML = Object.entries(recipientsData)
-            .map(([name, amount]) => `
-                <div class="d-flex justify-content-between align-items-center mb-2">
-                    <span>${name}</span>
-                    <span class="badge bg-primary">${amount.toLocaleString()} RWF</span>
-                </div>
-            `).join('');
-        
-        // Display top senders
-        const topSendersDiv = document.getElementById('topSenders');
-        topSendersDiv.innerHTML = Object.entries(sendersData)
-            .map(([name, amount]) => `
-                <div class="d-flex justify-content-between align-items-center mb-2">
-                    <span>${name}</span>
-                    <span class="badge bg-primary">${amount.toLocaleString()} RWF</span>
-                </div>
-            `).join('');
-    } catch (error) {
-        console.error('Error loading top entities:', error);
-    }
+// Display top entities
+function displayTopEntities(recipientsData, sendersData) {
+    // Display top recipients
+    const topRecipientsDiv = document.getElementById('topRecipients');
+    topRecipientsDiv.innerHTML = Object.entries(recipientsData)
+        .map(([name, amount]) => `
+            <div class="d-flex justify-content-between align-items-center mb-2">
+                <span>${name}</span>
+                <span class="badge bg-primary">${amount.toLocaleString()} RWF</span>
+            </div>
+        `).join('');
+    
+    // Display top senders
+    const topSendersDiv = document.getElementById('topSenders');
+    topSendersDiv.innerHTML = Object.entries(sendersData)
+        .map(([name, amount]) => `
+            <div class="d-flex justify-content-between align-items-center mb-2">
+                <span>${name}</span>
+                <span class="badge bg-primary">${amount.toLocaleString()} RWF</span>
+            </div>
+        `).join('');
 }
 
 // Set up event listeners
@@ -257,11 +193,8 @@ async function applyFilters() {
         const response = await fetch(`${ENDPOINTS.messages}?${params.toString()}`);
         const data = await response.json();
         
-        // Update display
+        // Update display (the charts summarize all messages, so they don't change with the filters)
         updateMessagesTable(data.messages);
-        
-        // Reload charts with filtered data
-        await loadCharts();
     } catch (error) {
         console.error('Error applying filters:', error);
     }